@@ -0,0 +1,8 @@
+"""
+曲库管理模块
+乐谱分析与目录查询
+"""
+
+from .catalog import Catalog, SheetStats
+
+__all__ = ["Catalog", "SheetStats"]
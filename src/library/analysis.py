@@ -0,0 +1,164 @@
+"""
+曲库分析
+用 NumPy 对一批乐谱整体做向量化统计：平均密度、峰值密度窗口、最大和弦、
+最小起音间隔和 15 键使用分布，结果写入曲库目录
+"""
+
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from src.player.sheet import KEY_COUNT, Sheet, key_index, load_sheet, scan_sheets
+from .catalog import Catalog, SheetStats
+
+# 峰值密度统计窗口 (毫秒)
+DENSITY_WINDOW_MS = 1000
+# 计算平均密度时的最短时间跨度 (毫秒)，避免极短的乐谱密度虚高
+MIN_SPAN_MS = 1000
+
+
+def analyze_sheets(sheets: list[tuple[str, Sheet]],
+                   window_ms: int = DENSITY_WINDOW_MS) -> list[SheetStats]:
+    """批量分析乐谱
+
+    所有乐谱的音符拼接为一组数组后一次性计算，不逐首循环
+
+    Args:
+        sheets: [(文件路径, 乐谱), ...]
+        window_ms: 峰值密度统计窗口 (毫秒)
+    """
+    n = len(sheets)
+    if n == 0:
+        return []
+
+    counts = np.array([len(sheet.notes or []) for _, sheet in sheets], dtype=np.int64)
+    total = int(counts.sum())
+    sid = np.repeat(np.arange(n, dtype=np.int64), counts)
+    times = np.fromiter((note.time for _, sheet in sheets for note in sheet.notes or []),
+                        dtype=np.int64, count=total)
+    keys = np.fromiter((key_index(note.key) for _, sheet in sheets for note in sheet.notes or []),
+                       dtype=np.int64, count=total)
+
+    # 按 (乐谱, 时间) 排序
+    order = np.lexsort((times, sid))
+    sid, times, keys = sid[order], times[order], keys[order]
+
+    has_notes = counts > 0
+    ends = np.cumsum(counts) - 1
+    duration = np.zeros(n, dtype=np.int64)
+    duration[has_notes] = times[ends[has_notes]]
+
+    # 平均密度按首尾音符之间的跨度计算，只有一个时间点的乐谱记为 0
+    first = np.zeros(n, dtype=np.int64)
+    first[has_notes] = times[(ends - counts + 1)[has_notes]]
+    span = duration - first
+    nps = np.zeros(n, dtype=np.float64)
+    timed = span > 0
+    nps[timed] = counts[timed] / (np.maximum(span[timed], MIN_SPAN_MS) / 1000.0)
+
+    # 起音分组: 同一乐谱同一时间点的音符构成一个和弦
+    is_onset = np.ones(total, dtype=bool)
+    if total > 1:
+        is_onset[1:] = (sid[1:] != sid[:-1]) | (times[1:] != times[:-1])
+    onset_idx = np.flatnonzero(is_onset)
+    chord_sizes = np.diff(np.append(onset_idx, total))
+    onset_sid = sid[onset_idx]
+    onset_times = times[onset_idx]
+
+    max_chord = np.zeros(n, dtype=np.int64)
+    np.maximum.at(max_chord, onset_sid, chord_sizes)
+
+    # 最小起音间隔
+    no_interval = np.iinfo(np.int64).max
+    min_interval = np.full(n, no_interval, dtype=np.int64)
+    if len(onset_idx) > 1:
+        same = onset_sid[1:] == onset_sid[:-1]
+        gaps = (onset_times[1:] - onset_times[:-1])[same]
+        np.minimum.at(min_interval, onset_sid[1:][same], gaps)
+    min_interval[min_interval == no_interval] = 0
+
+    # 峰值密度: 以每个音符为起点的窗口内的音符数，按乐谱取最大
+    # 用 (乐谱, 时间) 组合键把所有乐谱排成一条有序数组，一次 searchsorted 完成
+    stride = int(times.max(initial=0)) + window_ms + 1
+    combined = sid * stride + times
+    in_window = np.searchsorted(combined, combined + window_ms, side='left') - np.arange(total)
+    peak = np.zeros(n, dtype=np.int64)
+    np.maximum.at(peak, sid, in_window)
+    peak_at = np.zeros(n, dtype=np.int64)
+    if total:
+        is_peak = in_window == peak[sid]
+        first_sid, first_idx = np.unique(sid[is_peak], return_index=True)
+        peak_at[first_sid] = times[is_peak][first_idx]
+
+    # 15 键使用分布 (忽略无法识别的按键)
+    valid = keys >= 0
+    histogram = np.bincount(sid[valid] * KEY_COUNT + keys[valid],
+                            minlength=n * KEY_COUNT).reshape(n, KEY_COUNT)
+
+    return [
+        SheetStats(
+            path=path,
+            name=sheet.name,
+            note_count=int(counts[i]),
+            duration_ms=int(duration[i]),
+            notes_per_second=round(float(nps[i]), 3),
+            peak_density=int(peak[i]),
+            peak_density_at_ms=int(peak_at[i]),
+            max_chord=int(max_chord[i]),
+            min_interval_ms=int(min_interval[i]),
+            key_histogram=histogram[i].tolist(),
+        )
+        for i, (path, sheet) in enumerate(sheets)
+    ]
+
+
+def _load_checked(path: Path) -> Sheet:
+    """加载乐谱并检查音符字段类型，使有问题的乐谱在单个文件内失败
+
+    Raises:
+        ValueError: 音符时间不是数字或按键标识不是字符串
+    """
+    sheet = load_sheet(path)
+    for note in sheet.notes or []:
+        if not isinstance(note.time, (int, float)) or isinstance(note.time, bool):
+            raise ValueError(f"音符时间不是数字: {note.time!r}")
+        if not isinstance(note.key, str):
+            raise ValueError(f"按键标识不是字符串: {note.key!r}")
+    return sheet
+
+
+def analyze_library(sheets_dir: str | Path, catalog: Catalog,
+                    full: bool = False, batch_size: int = 500,
+                    progress: Optional[Callable[[int, int], None]] = None) -> tuple[int, int, int]:
+    """分析曲库并更新目录，默认只分析新增或修改过的乐谱
+
+    Args:
+        sheets_dir: 曲库目录
+        catalog: 曲库目录数据库
+        full: 是否全部重新分析
+        batch_size: 每批分析的乐谱数
+        progress: 进度回调 (已处理, 总数)
+
+    Returns:
+        (分析成功数, 失败数, 删除的过期记录数)
+    """
+    paths = scan_sheets(sheets_dir)
+    removed = catalog.prune(paths)
+    todo = paths if full else catalog.stale(paths)
+
+    analyzed = failed = 0
+    for start in range(0, len(todo), batch_size):
+        batch = []
+        for path in todo[start:start + batch_size]:
+            try:
+                batch.append((str(path), _load_checked(path)))
+            except Exception as e:
+                catalog.mark_failed(path, str(e))
+                failed += 1
+        catalog.upsert(analyze_sheets(batch))
+        analyzed += len(batch)
+        if progress:
+            progress(min(start + batch_size, len(todo)), len(todo))
+
+    return analyzed, failed, removed
@@ -0,0 +1,203 @@
+"""
+曲库目录
+用 SQLite 保存每首乐谱的分析结果，按难度、时长、密度等条件筛选时无需读取乐谱 JSON
+"""
+
+import json
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheets (
+    path               TEXT PRIMARY KEY,
+    mtime_ns           INTEGER NOT NULL,
+    size               INTEGER NOT NULL,
+    name               TEXT NOT NULL DEFAULT '',
+    note_count         INTEGER NOT NULL DEFAULT 0,
+    duration_ms        INTEGER NOT NULL DEFAULT 0,
+    notes_per_second   REAL NOT NULL DEFAULT 0,
+    peak_density       INTEGER NOT NULL DEFAULT 0,
+    peak_density_at_ms INTEGER NOT NULL DEFAULT 0,
+    max_chord          INTEGER NOT NULL DEFAULT 0,
+    min_interval_ms    INTEGER NOT NULL DEFAULT 0,
+    key_histogram      TEXT NOT NULL DEFAULT '[]',
+    error              TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sheets_duration ON sheets(duration_ms);
+CREATE INDEX IF NOT EXISTS idx_sheets_nps ON sheets(notes_per_second);
+CREATE INDEX IF NOT EXISTS idx_sheets_chord ON sheets(max_chord);
+"""
+
+_COLUMNS = (
+    'path', 'name', 'note_count', 'duration_ms', 'notes_per_second', 'peak_density',
+    'peak_density_at_ms', 'max_chord', 'min_interval_ms', 'key_histogram',
+)
+
+# 允许的排序字段
+SORT_FIELDS = {
+    'name': 'name',
+    'duration': 'duration_ms',
+    'nps': 'notes_per_second',
+    'peak': 'peak_density',
+    'chord': 'max_chord',
+    'notes': 'note_count',
+}
+
+
+@dataclass
+class SheetStats:
+    """单首乐谱的分析结果"""
+    path: str                   # 乐谱文件路径
+    name: str                   # 歌曲名
+    note_count: int             # 音符数
+    duration_ms: int            # 总时长 (毫秒)
+    notes_per_second: float     # 平均每秒音符数
+    peak_density: int           # 任意 1 秒窗口内的最多音符数
+    peak_density_at_ms: int     # 峰值窗口的起点 (毫秒)
+    max_chord: int              # 最大和弦音数
+    min_interval_ms: int        # 最小起音间隔 (毫秒)，只有一个时间点时为 0
+    key_histogram: list[int] = field(default_factory=list)  # 15 键使用次数
+
+
+class Catalog:
+    """曲库目录"""
+
+    def __init__(self, path: str | Path):
+        """打开 (或创建) 目录数据库
+
+        Args:
+            path: SQLite 文件路径
+        """
+        self.path = Path(path)
+        self._conn = sqlite3.connect(self.path)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM sheets WHERE error IS NULL").fetchone()[0]
+
+    def stale(self, paths: list[Path]) -> list[Path]:
+        """筛选出需要重新分析的文件 (新增或修改过)"""
+        known = {
+            row[0]: (row[1], row[2])
+            for row in self._conn.execute("SELECT path, mtime_ns, size FROM sheets")
+        }
+        result = []
+        for path in paths:
+            stat = path.stat()
+            if known.get(str(path)) != (stat.st_mtime_ns, stat.st_size):
+                result.append(path)
+        return result
+
+    def prune(self, paths: list[Path]) -> int:
+        """删除已不存在的文件的记录
+
+        Returns:
+            删除的记录数
+        """
+        existing = {str(p) for p in paths}
+        removed = [row[0] for row in self._conn.execute("SELECT path FROM sheets")
+                   if row[0] not in existing]
+        with self._conn:
+            self._conn.executemany("DELETE FROM sheets WHERE path = ?", [(p,) for p in removed])
+        return len(removed)
+
+    def upsert(self, stats: list[SheetStats]):
+        """写入分析结果"""
+        rows = []
+        for s in stats:
+            stat = Path(s.path).stat()
+            rows.append((
+                s.path, stat.st_mtime_ns, stat.st_size, s.name, s.note_count, s.duration_ms,
+                s.notes_per_second, s.peak_density, s.peak_density_at_ms, s.max_chord,
+                s.min_interval_ms, json.dumps(s.key_histogram),
+            ))
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sheets (path, mtime_ns, size, name, note_count, duration_ms, "
+                "notes_per_second, peak_density, peak_density_at_ms, max_chord, min_interval_ms, "
+                "key_histogram, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+                rows,
+            )
+
+    def mark_failed(self, path: Path, error: str):
+        """记录解析失败的文件，文件修改前不再重复分析"""
+        stat = path.stat()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sheets (path, mtime_ns, size, error) VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_mtime_ns, stat.st_size, error),
+            )
+
+    def get(self, path: str | Path) -> Optional[SheetStats]:
+        """查询单首乐谱"""
+        row = self._conn.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM sheets WHERE path = ? AND error IS NULL",
+            (str(path),),
+        ).fetchone()
+        return _to_stats(row) if row else None
+
+    def query(self,
+              name: Optional[str] = None,
+              max_duration_ms: Optional[int] = None,
+              max_notes_per_second: Optional[float] = None,
+              max_peak_density: Optional[int] = None,
+              max_chord: Optional[int] = None,
+              min_interval_ms: Optional[int] = None,
+              sort: str = 'name',
+              descending: bool = False,
+              limit: Optional[int] = None) -> list[SheetStats]:
+        """按条件筛选乐谱
+
+        Args:
+            name: 曲名包含的文字
+            max_duration_ms: 最长时长 (毫秒)
+            max_notes_per_second: 最高平均每秒音符数
+            max_peak_density: 任意 1 秒内的最多音符数上限
+            max_chord: 最大和弦音数上限
+            min_interval_ms: 最小起音间隔下限 (毫秒)
+            sort: 排序字段，见 SORT_FIELDS
+            descending: 是否降序
+            limit: 最多返回条数
+        """
+        conditions = ["error IS NULL"]
+        params: list = []
+        for column, op, value in (
+            ('name', 'LIKE', f'%{name}%' if name else None),
+            ('duration_ms', '<=', max_duration_ms),
+            ('notes_per_second', '<=', max_notes_per_second),
+            ('peak_density', '<=', max_peak_density),
+            ('max_chord', '<=', max_chord),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        if min_interval_ms is not None:
+            # 只有一个时间点的乐谱 (间隔记为 0) 不受限制
+            conditions.append("(min_interval_ms >= ? OR min_interval_ms = 0)")
+            params.append(min_interval_ms)
+
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        sql = (f"SELECT {', '.join(_COLUMNS)} FROM sheets WHERE {' AND '.join(conditions)} "
+               f"ORDER BY {SORT_FIELDS[sort]} {'DESC' if descending else 'ASC'}")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_to_stats(row) for row in self._conn.execute(sql, params)]
+
+
+def _to_stats(row: tuple) -> SheetStats:
+    values = dict(zip(_COLUMNS, row))
+    values['key_histogram'] = json.loads(values['key_histogram'])
+    return SheetStats(**values)
@@ -0,0 +1,302 @@
+"""
+乐谱批量导入
+识别社区导出的多种乐谱格式，在进程池中并行转换和校验，
+统一写成标准的光遇乐谱格式 ({songName, songNotes: [{time, key}]}) 放入曲库
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from src.player.sheet import KEY_COUNT
+
+# 参与导入的文件类型 (社区乐谱常以 .txt 分发，内容仍为 JSON)
+SOURCE_SUFFIXES = ('.json', '.txt')
+
+# 识别出的格式
+FORMAT_SKY = 'sky'                   # {songName, songNotes: [{time, key}]}
+FORMAT_GENSHIN_MUSIC = 'genshin-music'  # {name, notes: [[index, time, layer], ...]}
+
+# 导入结果
+STATUS_OK = 'ok'
+STATUS_SKIPPED = 'skipped'
+STATUS_FAILED = 'failed'
+
+# 各字段的候选名称，按优先级排列
+_NAME_FIELDS = ('songName', 'name', 'title')
+_AUTHOR_FIELDS = ('author', 'artist')
+_TRANSCRIBER_FIELDS = ('transcribedBy', 'transcriber', 'arrangedBy')
+_NOTES_FIELDS = ('songNotes', 'notes')
+_TIME_FIELDS = ('time', 't')
+_KEY_FIELDS = ('key', 'k', 'note')
+
+# 按键标识，兼容 "1Key0"、"2Key14"、"Key3"、"1key3" 等前缀写法
+_KEY_PATTERN = re.compile(r'^\d*key(\d+)$', re.IGNORECASE)
+
+# 每首乐谱最多记录的同类警告样例数
+_MAX_SAMPLES = 5
+
+
+@dataclass
+class ImportResult:
+    """单个文件的导入结果"""
+    source: str                     # 源文件
+    status: str                     # STATUS_OK / STATUS_SKIPPED / STATUS_FAILED
+    dest: str = ""                  # 写入的文件
+    format: str = ""                # 识别出的格式
+    name: str = ""                  # 曲名
+    notes: int = 0                  # 导入的音符数
+    warnings: list[str] = field(default_factory=list)  # 已自动修正的问题
+    error: str = ""                 # 失败原因
+
+
+def _first(data: dict, fields: tuple[str, ...], default: Any = None) -> Any:
+    """取第一个存在且非空的字段"""
+    for name in fields:
+        value = data.get(name)
+        if value not in (None, ''):
+            return value
+    return default
+
+
+def _key_index(value: Any) -> int:
+    """按键标识或键位序号转换为 0-14，无法识别时返回 -1"""
+    if isinstance(value, bool):
+        return -1
+    if isinstance(value, int):
+        idx = value
+    elif isinstance(value, str):
+        value = value.strip()
+        match = _KEY_PATTERN.match(value)
+        if match:
+            idx = int(match.group(1))
+        elif value.isdigit():
+            idx = int(value)
+        else:
+            return -1
+    else:
+        return -1
+    return idx if 0 <= idx < KEY_COUNT else -1
+
+
+def detect_format(data: Any) -> tuple[str, dict]:
+    """识别乐谱格式
+
+    Returns:
+        (格式, 乐谱对象)
+
+    Raises:
+        ValueError: 无法识别或不支持的格式
+    """
+    # 兼容外层包一层数组的结构
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        raise ValueError("不是乐谱对象")
+
+    if data.get('isEncrypted') or isinstance(data.get('songNotes'), str):
+        raise ValueError("加密乐谱无法导入")
+    if data.get('type') == 'composed' or 'columns' in data:
+        raise ValueError("暂不支持编曲 (composed) 格式，请在原应用中导出为录制格式")
+
+    notes = _first(data, _NOTES_FIELDS)
+    if not isinstance(notes, list):
+        raise ValueError("未找到音符列表")
+    if notes and isinstance(notes[0], (list, tuple)):
+        return FORMAT_GENSHIN_MUSIC, data
+    return FORMAT_SKY, data
+
+
+def normalize(data: Any) -> tuple[str, dict, list[str]]:
+    """转换为标准乐谱格式并校验
+
+    未知按键会被丢弃、乱序的时间会重新排序 (记为警告)；
+    负数时间或没有可用音符视为错误
+
+    Returns:
+        (识别出的格式, 标准乐谱, 警告列表)
+
+    Raises:
+        ValueError: 无法识别的格式或校验失败
+    """
+    fmt, data = detect_format(data)
+    raw_notes = _first(data, _NOTES_FIELDS)
+
+    notes: list[tuple[int, int]] = []
+    unknown: list[str] = []
+    negative: list[int] = []
+    for item in raw_notes:
+        if fmt == FORMAT_GENSHIN_MUSIC:
+            # [键位序号, 时间, 层]，层用于编曲器中的乐器分组，导入时忽略
+            if len(item) < 2:
+                unknown.append(repr(item))
+                continue
+            key, time_value = item[0], item[1]
+        else:
+            if not isinstance(item, dict):
+                unknown.append(repr(item))
+                continue
+            key, time_value = _first(item, _KEY_FIELDS), _first(item, _TIME_FIELDS)
+
+        if not isinstance(time_value, (int, float)) or isinstance(time_value, bool):
+            unknown.append(repr(item))
+            continue
+        idx = _key_index(key)
+        if idx < 0:
+            unknown.append(repr(key))
+            continue
+        note_time = round(time_value)
+        if note_time < 0:
+            negative.append(note_time)
+            continue
+        notes.append((note_time, idx))
+
+    if negative:
+        raise ValueError(f"{len(negative)} 个音符的时间为负数 (如 {negative[0]})")
+    if not notes:
+        raise ValueError("没有可用的音符")
+
+    warnings = []
+    if unknown:
+        samples = ', '.join(unknown[:_MAX_SAMPLES])
+        warnings.append(f"丢弃 {len(unknown)} 个无法识别的音符: {samples}")
+    if any(notes[i][0] > notes[i + 1][0] for i in range(len(notes) - 1)):
+        notes.sort(key=lambda n: n[0])
+        warnings.append("音符时间未按顺序排列，已重新排序")
+
+    bpm = data.get('bpm')
+    sheet = {
+        'songName': str(_first(data, _NAME_FIELDS, '未知曲目')),
+        'author': str(_first(data, _AUTHOR_FIELDS, '')),
+        'transcribedBy': str(_first(data, _TRANSCRIBER_FIELDS, '')),
+        'bpm': bpm if isinstance(bpm, (int, float)) and not isinstance(bpm, bool) else 120,
+        'songNotes': [{'time': t, 'key': f'1Key{k}'} for t, k in notes],
+    }
+    return fmt, sheet, warnings
+
+
+def _read_json(path: Path) -> Any:
+    """读取 JSON 文件，尝试多种编码 (与 load_sheet 一致)"""
+    for enc in ('utf-8', 'utf-8-sig', 'gbk', 'utf-16'):
+        try:
+            with open(path, 'r', encoding=enc) as f:
+                return json.load(f)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            continue
+    raise ValueError("无法解析 JSON")
+
+
+def import_file(task: tuple[str, str, bool]) -> ImportResult:
+    """导入单个文件 (在进程池中执行)
+
+    Args:
+        task: (源文件, 目标文件, 是否覆盖已存在的目标)
+    """
+    source, dest, overwrite = task
+    result = ImportResult(source=source, status=STATUS_FAILED)
+    try:
+        dest_path = Path(dest)
+        if dest_path.exists() and not overwrite:
+            result.status = STATUS_SKIPPED
+            result.dest = dest
+            result.error = "目标文件已存在"
+            return result
+
+        fmt, sheet, warnings = normalize(_read_json(Path(source)))
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        # 临时文件名唯一，写完后原子替换
+        fd, tmp_name = tempfile.mkstemp(suffix='.tmp', prefix=dest_path.stem + '.', dir=dest_path.parent)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(sheet, f, ensure_ascii=False)
+            os.replace(tmp_name, dest_path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+        result.status = STATUS_OK
+        result.dest = dest
+        result.format = fmt
+        result.name = sheet['songName']
+        result.notes = len(sheet['songNotes'])
+        result.warnings = warnings
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+def collect_sources(paths: list[str | Path]) -> list[tuple[Path, Path]]:
+    """收集待导入的文件
+
+    Returns:
+        [(源文件, 相对路径), ...]，目录按原有结构保留相对路径
+    """
+    sources = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            for file in sorted(path.rglob('*')):
+                if file.suffix.lower() in SOURCE_SUFFIXES and file.is_file():
+                    sources.append((file, file.relative_to(path)))
+        elif path.is_file():
+            sources.append((path, Path(path.name)))
+    return sources
+
+
+def import_sheets(paths: list[str | Path], dest_dir: str | Path,
+                  workers: Optional[int] = None, overwrite: bool = False,
+                  progress: Optional[Callable[[int, int], None]] = None) -> Iterator[ImportResult]:
+    """并行导入乐谱，按完成顺序逐个产出结果
+
+    Args:
+        paths: 源文件或目录
+        dest_dir: 曲库目录
+        workers: 进程数，默认为 CPU 核心数
+        overwrite: 是否覆盖已存在的乐谱
+        progress: 进度回调 (已处理, 总数)
+    """
+    dest_dir = Path(dest_dir)
+
+    # 多个源文件对应同一目标 (如 a.txt 与 a.json，或不同目录下的同名相对路径) 时只导入第一个，
+    # 其余直接报告冲突，避免多个进程同时写同一文件
+    tasks = []
+    conflicts = []
+    claimed: dict[str, str] = {}
+    for source, relative in collect_sources(paths):
+        dest = str((dest_dir / relative).with_suffix('.json'))
+        key = os.path.normcase(os.path.abspath(dest))
+        if key in claimed:
+            conflicts.append(ImportResult(source=str(source), status=STATUS_FAILED, dest=dest,
+                                          error=f"目标文件与 {claimed[key]} 冲突"))
+        else:
+            claimed[key] = str(source)
+            tasks.append((str(source), dest, overwrite))
+
+    total = len(tasks) + len(conflicts)
+    if total == 0:
+        return
+
+    done = 0
+    for result in conflicts:
+        done += 1
+        if progress:
+            progress(done, total)
+        yield result
+    if not tasks:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    # 每批任务的大小: 兼顾进程间通信开销与进度刷新粒度
+    chunksize = max(1, min(64, len(tasks) // (workers * 8)))
+
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes=min(workers, len(tasks))) as pool:
+        for result in pool.imap_unordered(import_file, tasks, chunksize):
+            done += 1
+            if progress:
+                progress(done, total)
+            yield result
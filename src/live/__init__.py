@@ -3,7 +3,10 @@
 支持 B 站直播间弹幕接收和点播功能
 """
 
+from .api import ControlServer
 from .client import DanmakuClient
 from .handler import RequestHandler
+from .journal import QueueJournal
+from .orchestrator import PlaybackOrchestrator
 
-__all__ = ["DanmakuClient", "RequestHandler"]
+__all__ = ["ControlServer", "DanmakuClient", "PlaybackOrchestrator", "QueueJournal", "RequestHandler"]
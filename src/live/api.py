@@ -0,0 +1,262 @@
+"""
+本地控制/状态接口
+为直播叠加层和房管工具提供 HTTP 接口，状态变化通过 Server-Sent Events 推送
+多次变化会在推送间隔内合并，所有客户端共享同一份序列化结果
+"""
+
+import asyncio
+import hmac
+import json
+from typing import Optional
+
+from aiohttp import web
+
+from src.log import get_logger
+from src.trace import TRACER
+from .orchestrator import PlaybackOrchestrator, SongRequest
+
+_log = get_logger('queue')
+
+# 推送中附带的队列条数
+_EVENT_QUEUE_ITEMS = 10
+# 分页默认/最大条数
+_DEFAULT_PAGE_SIZE = 20
+_MAX_PAGE_SIZE = 200
+# SSE 心跳间隔 (秒)
+_KEEPALIVE_INTERVAL = 15.0
+# 停止服务时等待未完成请求的最长时间 (秒)
+_SHUTDOWN_TIMEOUT = 1.0
+# 通知 SSE 客户端连接关闭
+_CLOSE = None
+# 不改变状态的请求方法，不做来源检查
+_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# 控制令牌请求头
+TOKEN_HEADER = 'X-Sky-Forge-Token'
+
+
+def _request_json(request: SongRequest) -> dict:
+    return {
+        'id': request.id,
+        'song_name': request.song_name,
+        'requester': request.requester,
+    }
+
+
+class ControlServer:
+    """控制/状态 HTTP 服务，运行在直播进程的事件循环中"""
+
+    def __init__(self, orchestrator: PlaybackOrchestrator,
+                 host: str = '127.0.0.1', port: int = 8765, coalesce: float = 0.2,
+                 token: Optional[str] = None):
+        """初始化服务
+
+        Args:
+            orchestrator: 播放编排器
+            host: 监听地址，默认只监听本机
+            port: 监听端口
+            coalesce: 推送合并间隔 (秒)
+            token: 控制令牌 (可选)，设置后控制接口需在 X-Sky-Forge-Token 请求头中携带
+        """
+        self.orchestrator = orchestrator
+        self.token = token
+        self.host = host
+        self.port = port
+        self.coalesce = coalesce
+        self._runner: Optional[web.AppRunner] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._dirty = False
+        self._broadcaster: Optional[asyncio.Task] = None
+        self._clients: set[asyncio.Queue] = set()
+        self._latest: bytes = b''
+
+    async def start(self):
+        """启动服务"""
+        if self._runner:
+            return
+
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._latest = self._encode_event()
+
+        app = web.Application(middlewares=[self._guard])
+        app.add_routes([
+            web.get('/api/status', self._get_status),
+            web.get('/api/queue', self._get_queue),
+            web.delete('/api/queue/{id}', self._remove_request),
+            web.post('/api/skip', self._skip),
+            web.post('/api/pause', self._pause),
+            web.post('/api/resume', self._resume),
+            web.get('/api/events', self._events),
+            web.get('/api/trace', self._get_trace),
+        ])
+        self._runner = web.AppRunner(app, access_log=None, shutdown_timeout=_SHUTDOWN_TIMEOUT)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+        self.orchestrator.add_listener(self._on_change)
+        self._broadcaster = asyncio.create_task(self._broadcast())
+        _log.info("控制接口: http://%s:%d/api/status", self.host, self.port)
+
+    async def stop(self):
+        """停止服务"""
+        if not self._runner:
+            return
+        self.orchestrator.remove_listener(self._on_change)
+        if self._broadcaster:
+            self._broadcaster.cancel()
+            self._broadcaster = None
+        # SSE 连接不会自行结束，先让所有推送循环退出，否则 cleanup 会一直等待
+        for client in self._clients:
+            self._offer(client, _CLOSE)
+        await self._runner.cleanup()
+        self._runner = None
+
+    @web.middleware
+    async def _guard(self, request: web.Request, handler):
+        """控制接口的来源检查
+
+        浏览器中任意网页都能向本机端口发送跨站表单 POST，
+        因此改变状态的请求拒绝跨站来源，并在设置了令牌时校验令牌
+        """
+        if request.method not in _SAFE_METHODS:
+            if _is_cross_site(request):
+                raise web.HTTPForbidden(reason='拒绝跨站请求')
+            if self.token and not hmac.compare_digest(
+                    request.headers.get(TOKEN_HEADER, '').encode('utf-8'), self.token.encode('utf-8')):
+                raise web.HTTPUnauthorized(reason='控制令牌无效')
+        return await handler(request)
+
+    # ---- 状态快照 ----
+
+    def _status(self) -> dict:
+        current = self.orchestrator.current
+        progress, total = self.orchestrator.progress if current else (0, 0)
+        return {
+            'version': self.orchestrator.version,
+            'state': self.orchestrator.state,
+            'now_playing': _request_json(current) if current else None,
+            'progress': {'current': progress, 'total': total},
+            'queue_length': self.orchestrator.queue_length,
+        }
+
+    def _encode_event(self) -> bytes:
+        """序列化一次推送内容"""
+        status = self._status()
+        status['queue'] = [_request_json(r) for r in self.orchestrator.snapshot(0, _EVENT_QUEUE_ITEMS)]
+        data = json.dumps(status, ensure_ascii=False)
+        return f"event: status\ndata: {data}\n\n".encode('utf-8')
+
+    # ---- 推送 ----
+
+    def _on_change(self):
+        """编排器状态变化 (在编排线程或计时线程中调用)"""
+        # 合并期间的重复通知直接忽略，避免每个音符都唤醒事件循环
+        if self._dirty or self._loop is None:
+            return
+        self._dirty = True
+        self._loop.call_soon_threadsafe(self._changed.set)
+
+    async def _broadcast(self):
+        """合并状态变化并推送给所有客户端"""
+        while True:
+            await self._changed.wait()
+            await asyncio.sleep(self.coalesce)
+            self._changed.clear()
+            self._dirty = False
+
+            self._latest = self._encode_event()
+            for client in self._clients:
+                self._offer(client, self._latest)
+
+    @staticmethod
+    def _offer(client: asyncio.Queue, payload: Optional[bytes]):
+        """放入客户端队列，每个客户端只保留最新一份，慢客户端不会积压"""
+        if client.full():
+            client.get_nowait()
+        client.put_nowait(payload)
+
+    async def _events(self, request: web.Request) -> web.StreamResponse:
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+        })
+        await response.prepare(request)
+
+        client: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._clients.add(client)
+        try:
+            await response.write(self._latest)
+            while True:
+                try:
+                    payload = await asyncio.wait_for(client.get(), _KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    payload = b': keepalive\n\n'
+                if payload is _CLOSE:
+                    break
+                await response.write(payload)
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(client)
+        return response
+
+    # ---- 查询 ----
+
+    async def _get_status(self, request: web.Request) -> web.Response:
+        return web.json_response(self._status(), dumps=_dumps)
+
+    async def _get_queue(self, request: web.Request) -> web.Response:
+        try:
+            offset = max(int(request.query.get('offset', 0)), 0)
+            limit = min(max(int(request.query.get('limit', _DEFAULT_PAGE_SIZE)), 1), _MAX_PAGE_SIZE)
+        except ValueError:
+            raise web.HTTPBadRequest(reason='offset/limit 必须为整数')
+
+        items = self.orchestrator.snapshot(offset, limit)
+        return web.json_response({
+            'version': self.orchestrator.version,
+            'total': self.orchestrator.queue_length,
+            'offset': offset,
+            'items': [_request_json(r) for r in items],
+        }, dumps=_dumps)
+
+    async def _get_trace(self, request: web.Request) -> web.Response:
+        return web.json_response(TRACER.to_chrome_trace(), dumps=_dumps)
+
+    # ---- 控制 ----
+
+    async def _remove_request(self, request: web.Request) -> web.Response:
+        try:
+            request_id = int(request.match_info['id'])
+        except ValueError:
+            raise web.HTTPBadRequest(reason='id 必须为整数')
+        if not any(r.id == request_id for r in self.orchestrator.snapshot()):
+            raise web.HTTPNotFound(reason='队列中没有该请求')
+        self.orchestrator.remove(request_id)
+        return web.json_response({'accepted': True}, status=202)
+
+    async def _skip(self, request: web.Request) -> web.Response:
+        self.orchestrator.skip(request.query.get('by', '控制接口'))
+        return web.json_response({'accepted': True}, status=202)
+
+    async def _pause(self, request: web.Request) -> web.Response:
+        self.orchestrator.pause()
+        return web.json_response({'accepted': True}, status=202)
+
+    async def _resume(self, request: web.Request) -> web.Response:
+        self.orchestrator.resume()
+        return web.json_response({'accepted': True}, status=202)
+
+
+def _is_cross_site(request: web.Request) -> bool:
+    """请求是否来自其他网页 (非浏览器客户端不带这些请求头)"""
+    fetch_site = request.headers.get('Sec-Fetch-Site')
+    if fetch_site and fetch_site not in ('same-origin', 'none'):
+        return True
+    origin = request.headers.get('Origin')
+    return origin is not None and origin != f"{request.scheme}://{request.host}"
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False)
@@ -5,6 +5,7 @@ B站直播弹幕客户端
 
 import asyncio
 import http.cookies
+import logging
 from dataclasses import dataclass
 from typing import Callable, Optional
 
@@ -13,6 +14,15 @@ import aiohttp
 import blivedm
 import blivedm.models.web as web_models
 
+from src import metrics
+from src.log import CHAT_LOGGER, get_logger
+from src.trace import TRACER
+
+_log = get_logger('danmaku')
+_chat_log = logging.getLogger(CHAT_LOGGER)
+
+_DANMAKU_TOTAL = metrics.counter('skyforge_danmaku_messages_total', '收到的弹幕条数')
+
 
 @dataclass
 class DanmakuMessage:
@@ -21,32 +31,40 @@ class DanmakuMessage:
     uid: int        # 用户ID
     msg: str        # 消息内容
     room_id: int    # 房间号
+    timestamp: int = 0  # 发送时间 (Unix 毫秒)
+    trace_id: int = 0   # 追踪请求 ID (0 表示不追踪)
 
 
 class DanmakuClient:
     """B站直播弹幕客户端"""
 
-    def __init__(self, room_id: int, sessdata: str = ""):
+    def __init__(self, room_id: int, sessdata: str = "", echo_chat: bool = False):
         """初始化弹幕客户端
 
         Args:
             room_id: 直播间ID
             sessdata: B站登录cookie中的SESSDATA（可选，用于获取完整用户名）
+            echo_chat: 是否回显非指令弹幕 (指令始终回显)
         """
         self.room_id = room_id
         self.sessdata = sessdata
+        self.echo_chat = echo_chat
         self._session: Optional[aiohttp.ClientSession] = None
         self._client: Optional[blivedm.BLiveClient] = None
         self._on_danmaku: Optional[Callable[[DanmakuMessage], None]] = None
+        self._accepts: Optional[Callable[[str], bool]] = None
         self._running = False
 
-    def set_danmaku_handler(self, handler: Callable[[DanmakuMessage], None]):
+    def set_danmaku_handler(self, handler: Callable[[DanmakuMessage], None],
+                            accepts: Optional[Callable[[str], bool]] = None):
         """设置弹幕处理器
 
         Args:
             handler: 弹幕处理回调函数
+            accepts: 快速过滤 (可选)，返回 False 的弹幕不会创建消息对象、也不会交给处理器
         """
         self._on_danmaku = handler
+        self._accepts = accepts
 
     def _create_session(self) -> aiohttp.ClientSession:
         """创建带有cookie的session"""
@@ -70,7 +88,7 @@ class DanmakuClient:
         self._client.start()
 
         self._running = True
-        print(f"[弹幕] 已连接直播间: {self.room_id}")
+        _log.info("已连接直播间: %s", self.room_id)
 
     async def stop(self):
         """停止弹幕客户端"""
@@ -86,7 +104,7 @@ class DanmakuClient:
             self._session = None
 
         self._running = False
-        print("[弹幕] 已断开连接")
+        _log.info("已断开连接")
 
     async def join(self):
         """等待客户端运行"""
@@ -95,14 +113,30 @@ class DanmakuClient:
 
     def _on_message(self, client: blivedm.BLiveClient, message: web_models.DanmakuMessage):
         """处理弹幕消息"""
-        if self._on_danmaku:
-            msg = DanmakuMessage(
-                uname=message.uname,
-                uid=message.uid,
-                msg=message.msg,
-                room_id=client.room_id
-            )
-            self._on_danmaku(msg)
+        _DANMAKU_TOTAL.inc()
+
+        # 快速路径: 绝大多数弹幕不是指令，在回显、创建消息和追踪请求之前拒绝
+        is_command = self._on_danmaku is not None and (self._accepts is None or self._accepts(message.msg))
+        if not (is_command or self.echo_chat):
+            return
+
+        # 回显收到的弹幕 (控制台限流)
+        if _chat_log.isEnabledFor(logging.INFO):
+            _chat_log.info("%s: %s", message.uname, message.msg,
+                           extra={'fields': {'uid': message.uid, 'uname': message.uname, 'text': message.msg}})
+        if not is_command:
+            return
+
+        # 以收到弹幕的时刻作为请求起点
+        msg = DanmakuMessage(
+            uname=message.uname,
+            uid=message.uid,
+            msg=message.msg,
+            room_id=client.room_id,
+            timestamp=message.timestamp,
+            trace_id=TRACER.new_request(),
+        )
+        self._on_danmaku(msg)
 
 
 class _Handler(blivedm.BaseHandler):
@@ -0,0 +1,99 @@
+"""
+弹幕指令路由
+由指令注册表 (指令及其别名) 编译成前缀树，
+绝大多数弹幕不是指令，用一次首字符检查即可拒绝，不创建任何对象
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+# 指令标识
+CMD_REQUEST = 'request'        # 点播
+CMD_QUEUE = 'queue'            # 查看队列
+CMD_SKIP = 'skip'              # 跳过
+CMD_CANCEL = 'cancel'          # 取消自己最近的点播
+CMD_POSITION = 'position'      # 查看自己的排队位置
+CMD_VOTE_SKIP = 'vote_skip'    # 投票跳过
+
+# 前缀树中标记指令结尾的键 (不会与单个字符冲突)
+_END = ''
+
+
+@dataclass(frozen=True)
+class Command:
+    """弹幕指令"""
+    name: str                       # 指令标识
+    aliases: tuple[str, ...]        # 弹幕中的写法
+    takes_argument: bool = False    # 是否带参数 (与指令之间以空白分隔)
+    description: str = ""           # 说明
+
+
+# 指令注册表
+COMMANDS = (
+    Command(CMD_REQUEST, ("点播", "播放", "点歌", "来首"), takes_argument=True, description="添加到播放队列"),
+    Command(CMD_QUEUE, ("队列",), description="查看当前播放队列"),
+    Command(CMD_SKIP, ("跳过",), description="跳过当前曲目"),
+    Command(CMD_CANCEL, ("取消",), description="取消自己最近的一次点播"),
+    Command(CMD_POSITION, ("位置", "我的位置"), description="查看自己点播的排队位置"),
+    Command(CMD_VOTE_SKIP, ("投票跳过",), description="投票跳过当前曲目，达到票数后跳过"),
+)
+
+
+class CommandRouter:
+    """指令路由 - 按最长别名匹配"""
+
+    def __init__(self, commands: Iterable[Command] = COMMANDS):
+        """编译前缀树
+
+        Args:
+            commands: 指令注册表
+
+        Raises:
+            ValueError: 别名为空或重复
+        """
+        self._root: dict = {}
+        starts = set()
+        for command in commands:
+            for alias in command.aliases:
+                if not alias:
+                    raise ValueError(f"指令 {command.name} 的别名为空")
+                node = self._root
+                for char in alias:
+                    node = node.setdefault(char, {})
+                if _END in node:
+                    raise ValueError(f"指令别名重复: {alias}")
+                node[_END] = command
+                starts.add(alias[0])
+        # str.startswith 接受元组，检查时不产生新对象
+        self._starts = tuple(starts)
+
+    def accepts(self, text: str) -> bool:
+        """快速判断弹幕是否可能是指令 (只检查首字符)"""
+        return text.startswith(self._starts)
+
+    def match(self, text: str) -> Optional[tuple[Command, str]]:
+        """匹配指令
+
+        Returns:
+            (指令, 参数)，不是指令时返回 None
+        """
+        if not text.startswith(self._starts):
+            return None
+
+        node = self._root
+        found = None
+        for i, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                break
+            command = node.get(_END)
+            if command is None:
+                continue
+            rest = text[i + 1:]
+            if command.takes_argument:
+                # 参数与指令之间需有空白 (含全角空格)，且不能为空
+                if rest[:1].isspace() and not rest.isspace():
+                    found = (command, rest.strip())
+            elif not rest or rest.isspace():
+                found = (command, "")
+        return found
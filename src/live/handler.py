@@ -1,48 +1,65 @@
 """
 点播请求处理器
-解析弹幕中的点播指令，管理播放队列
+解析弹幕中的点播指令，交由播放编排器排队播放
 """
 
-import threading
-from dataclasses import dataclass
+import time
 from pathlib import Path
 from typing import Optional
 
+from src import metrics
+from src.log import get_logger
 from src.player import Player
-from src.player.sheet import load_sheet, scan_sheets
+from src.player.sheet import scan_sheets
+from src.trace import TRACER
 from .client import DanmakuMessage
+from .commands import (CMD_CANCEL, CMD_POSITION, CMD_QUEUE, CMD_REQUEST, CMD_SKIP, CMD_VOTE_SKIP,
+                       CommandRouter)
+from .journal import QueueJournal
+from .orchestrator import PlaybackOrchestrator, SongRequest
 
+_log = get_logger('queue')
 
-@dataclass
-class SongRequest:
-    """点播请求"""
-    song_name: str      # 曲名
-    requester: str      # 点播者
-    file_path: Path     # 乐谱文件路径
+_REQUESTS_TOTAL = metrics.counter('skyforge_song_requests_total', '点播指令条数')
+_NOT_FOUND_TOTAL = metrics.counter('skyforge_song_not_found_total', '未找到曲目的点播条数')
+_FIND_SECONDS = metrics.histogram('skyforge_find_sheet_seconds', '曲库查找耗时 (秒)')
 
 
 class RequestHandler:
     """点播请求处理器"""
 
-    # 点播指令前缀
-    REQUEST_PREFIXES = ["点播 ", "播放 ", "点歌 ", "来首 "]
-
-    def __init__(self, player: Player, sheets_dir: Path):
+    def __init__(self, player: Player, sheets_dir: Path, journal: Optional[QueueJournal] = None,
+                 vote_skip_threshold: int = 3):
         """初始化处理器
 
         Args:
             player: 播放器实例
             sheets_dir: 曲库目录
+            journal: 队列日志 (可选)，启动时恢复上次的队列
+            vote_skip_threshold: 投票跳过当前曲目所需的票数
         """
         self.player = player
         self.sheets_dir = sheets_dir
-        self._queue: list[SongRequest] = []
-        self._lock = threading.Lock()
-        self._current_request: Optional[SongRequest] = None
         self._sheets_cache: Optional[list[Path]] = None
-
-        # 设置播放完成回调
-        self.player.set_complete_callback(self._on_play_complete)
+        self.router = CommandRouter()
+
+        # 播放器和队列由编排器独占，这里只负责解析指令
+        self.orchestrator = PlaybackOrchestrator(player, journal=journal,
+                                                 vote_skip_threshold=vote_skip_threshold)
+        self.orchestrator.start()
+
+        # 不带参数的指令，参数为发送者的用户名和用户 ID
+        self._routes = {
+            CMD_QUEUE: self._show_queue,
+            CMD_SKIP: self._skip_current,
+            CMD_CANCEL: self._cancel,
+            CMD_POSITION: self._show_position,
+            CMD_VOTE_SKIP: self._vote_skip,
+        }
+
+    def close(self):
+        """停止编排线程"""
+        self.orchestrator.close()
 
     def handle_danmaku(self, msg: DanmakuMessage):
         """处理弹幕消息
@@ -50,51 +67,65 @@ class RequestHandler:
         Args:
             msg: 弹幕消息
         """
-        # 显示收到的弹幕
-        print(f"[弹幕] {msg.uname}: {msg.msg}")
-
-        # 检查是否是点播指令
-        for prefix in self.REQUEST_PREFIXES:
-            if msg.msg.startswith(prefix):
-                song_name = msg.msg[len(prefix):].strip()
-                if song_name:
-                    self.request_song(song_name, msg.uname)
-                return
-
-        # 检查其他指令
-        if msg.msg.strip() == "队列":
-            self._show_queue(msg.uname)
-        elif msg.msg.strip() == "跳过":
-            self._skip_current(msg.uname)
-
-    def request_song(self, song_name: str, requester: str = ""):
+        start_ns = time.perf_counter_ns()
+
+        submitted = False
+        matched = self.router.match(msg.msg)
+        if matched:
+            command, argument = matched
+            if command.name == CMD_REQUEST:
+                submitted = self.request_song(argument, msg.uname, msg.trace_id, msg.uid)
+            else:
+                self._routes[command.name](msg.uname, msg.uid)
+
+        # 只追踪进入队列的点播
+        if submitted:
+            TRACER.record('handle_danmaku', msg.trace_id, start_ns)
+            if msg.timestamp:
+                # 发送端时钟与本机不同步，仅作参考
+                delivery_ms = max(int(time.time() * 1000) - msg.timestamp, 0)
+                TRACER.record('danmaku.delivery', msg.trace_id,
+                              start_ns - delivery_ms * 1_000_000, start_ns, delivery_ms=delivery_ms)
+        else:
+            TRACER.discard(msg.trace_id)
+
+    def request_song(self, song_name: str, requester: str = "", trace_id: int = 0, uid: int = 0) -> bool:
         """点播歌曲
 
         Args:
             song_name: 曲名（支持模糊匹配）
             requester: 点播者
+            trace_id: 追踪请求 ID
+            uid: 点播者用户 ID (0 表示未知)
+
+        Returns:
+            是否已加入队列
         """
+        _REQUESTS_TOTAL.inc()
+
         # 查找乐谱
+        start_ns = time.perf_counter_ns()
         sheet_path = self._find_sheet(song_name)
+        end_ns = time.perf_counter_ns()
+        _FIND_SECONDS.observe((end_ns - start_ns) / 1e9)
         if not sheet_path:
-            print(f"[点播] 未找到曲目: {song_name}")
-            return
+            _NOT_FOUND_TOTAL.inc()
+            _log.info("未找到曲目: %s", song_name,
+                      extra={'fields': {'song': song_name, 'requester': requester}})
+            return False
+        # 只追踪进入队列的点播，未找到的请求不写入追踪缓冲
+        TRACER.record('find_sheet', trace_id, start_ns, end_ns, song=song_name)
 
         request = SongRequest(
             song_name=song_name,
             requester=requester,
-            file_path=sheet_path
+            file_path=sheet_path,
+            trace_id=trace_id,
+            uid=uid,
         )
 
-        with self._lock:
-            self._queue.append(request)
-            queue_pos = len(self._queue)
-
-        print(f"[点播] {requester} 点播了 {song_name} (队列位置: {queue_pos})")
-
-        # 如果当前没有播放，立即开始
-        if not self.player.is_playing:
-            self._play_next()
+        self.orchestrator.submit(request)
+        return True
 
     def _find_sheet(self, song_name: str) -> Optional[Path]:
         """查找乐谱文件
@@ -126,50 +157,27 @@ class RequestHandler:
 
         return None
 
-    def _play_next(self):
-        """播放队列中的下一首"""
-        with self._lock:
-            if not self._queue:
-                self._current_request = None
-                print("[播放] 队列为空，等待点播...")
-                return
-
-            request = self._queue.pop(0)
-            self._current_request = request
-
-        try:
-            sheet = load_sheet(request.file_path)
-            self.player.load(sheet)
-            self.player.play()
-            print(f"[播放] 开始演奏: {sheet.name} (点播者: {request.requester})")
-        except Exception as e:
-            print(f"[播放] 加载乐谱失败: {e}")
-            self._play_next()  # 尝试下一首
-
-    def _on_play_complete(self):
-        """播放完成回调"""
-        if self._current_request:
-            print(f"[播放] 演奏完成: {self._current_request.song_name}")
-        self._play_next()
-
-    def _show_queue(self, requester: str):
+    def _show_queue(self, requester: str, uid: int = 0):
         """显示当前队列"""
-        with self._lock:
-            if not self._queue:
-                print("[队列] 当前队列为空")
-            else:
-                print(f"[队列] 共 {len(self._queue)} 首待播:")
-                for i, req in enumerate(self._queue, 1):
-                    print(f"  {i}. {req.song_name} (点播者: {req.requester})")
+        self.orchestrator.show_queue()
 
-    def _skip_current(self, requester: str):
+    def _skip_current(self, requester: str, uid: int = 0):
         """跳过当前曲目"""
-        if self.player.is_playing:
-            self.player.stop()
-            print(f"[跳过] {requester} 跳过了当前曲目")
+        self.orchestrator.skip(requester)
+
+    def _cancel(self, requester: str, uid: int = 0):
+        """取消点播者最近的点播"""
+        self.orchestrator.cancel(requester, uid)
+
+    def _show_position(self, requester: str, uid: int = 0):
+        """显示点播者的排队位置"""
+        self.orchestrator.show_position(requester, uid)
+
+    def _vote_skip(self, voter: str, uid: int = 0):
+        """投票跳过当前曲目"""
+        self.orchestrator.vote_skip(voter, uid)
 
     @property
     def queue_length(self) -> int:
         """当前队列长度"""
-        with self._lock:
-            return len(self._queue)
+        return self.orchestrator.queue_length
@@ -0,0 +1,182 @@
+"""
+点播队列日志
+以 JSON Lines 追加记录队列变更和播放位置，后台线程批量 fsync 并定期压缩，
+进程重启时重放日志恢复队列和当前曲目的播放位置
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from src.log import get_logger
+
+_log = get_logger('queue')
+
+# 记录类型
+OP_ADD = 'add'        # 加入队列 {id, song, requester, uid, path}
+OP_REMOVE = 'remove'  # 移出队列 {id}
+OP_START = 'start'    # 开始演奏 {id}
+OP_POS = 'pos'        # 播放位置 {id, idx}
+OP_DONE = 'done'      # 演奏结束 {id}
+
+
+@dataclass
+class JournalState:
+    """重放后的队列状态"""
+    queue: OrderedDict[int, dict] = field(default_factory=OrderedDict)  # 待播请求
+    current: Optional[dict] = None    # 正在演奏的请求
+    position: int = 0                 # 当前曲目的播放位置 (时间点序号)
+    next_id: int = 1                  # 下一个可用的请求编号
+
+    def apply(self, record: dict):
+        """应用一条记录"""
+        op = record.get('op')
+        request_id = record.get('id')
+        if op == OP_ADD:
+            self.queue[request_id] = record
+        elif op == OP_REMOVE:
+            self.queue.pop(request_id, None)
+        elif op == OP_START:
+            entry = self.queue.pop(request_id, None)
+            if entry is None and self.current and self.current['id'] == request_id:
+                entry = self.current  # 恢复后重新开始的同一首
+            self.current = entry
+            self.position = 0
+        elif op == OP_POS:
+            if self.current and self.current['id'] == request_id:
+                self.position = record.get('idx', 0)
+        elif op == OP_DONE:
+            if self.current and self.current['id'] == request_id:
+                self.current = None
+                self.position = 0
+        else:
+            return
+        if isinstance(request_id, int) and request_id >= self.next_id:
+            self.next_id = request_id + 1
+
+    def records(self) -> list[dict]:
+        """与当前状态等价的最少记录 (用于压缩)"""
+        records = []
+        if self.current:
+            records.append(self.current)
+            records.append({'op': OP_START, 'id': self.current['id']})
+            if self.position:
+                records.append({'op': OP_POS, 'id': self.current['id'], 'idx': self.position})
+        records.extend(self.queue.values())
+        return records
+
+
+class QueueJournal:
+    """点播队列日志"""
+
+    def __init__(self, path: str | Path, flush_interval: float = 0.2,
+                 compact_threshold: int = 5000):
+        """初始化日志
+
+        Args:
+            path: 日志文件路径
+            flush_interval: 批量写入并 fsync 的间隔 (秒)
+            compact_threshold: 记录数超过该值时压缩为当前状态
+        """
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+        self.state = JournalState()
+        self._pending: list[str] = []
+        self._entries = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def replay(self) -> JournalState:
+        """重放日志文件，返回恢复的状态"""
+        self.state = JournalState()
+        self._entries = 0
+        if not self.path.exists():
+            return self.state
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 崩溃时写了一半的行
+                self.state.apply(record)
+                self._entries += 1
+        return self.state
+
+    def open(self):
+        """打开日志文件并启动后台写入线程"""
+        if self._thread:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 启动时先压缩一次，丢弃重放过的历史和可能残缺的末行
+        self._compact()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='sky-forge-journal', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """写入剩余记录并关闭"""
+        if not self._thread:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+        self._flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def append(self, record: dict):
+        """追加一条记录 (可在任意线程调用，只做内存操作)"""
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.state.apply(record)
+            self._pending.append(line)
+            self._entries += 1
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self._flush()
+                if self._entries > self.compact_threshold:
+                    self._compact()
+            except OSError as e:
+                _log.error("写入点播日志失败: %s", e)
+
+    def _flush(self):
+        """批量写入待写记录并 fsync"""
+        with self._lock:
+            lines, self._pending = self._pending, []
+        if not lines or not self._file:
+            return
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _compact(self):
+        """用当前状态重写日志文件 (只在后台线程或线程启动前调用)"""
+        with self._lock:
+            # 待写记录已计入 state，压缩后无需再写
+            lines = [json.dumps(r, ensure_ascii=False) for r in self.state.records()]
+            self._pending = []
+
+        # 写临时文件和 fsync 不持锁，避免阻塞计时线程追加位置记录
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file:
+            self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+        with self._lock:
+            self._entries = len(lines) + len(self._pending)
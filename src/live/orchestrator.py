@@ -0,0 +1,481 @@
+"""
+播放编排器
+由单一常驻线程持有播放器与点播队列，其他线程只通过消息队列下发指令
+"""
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from src import metrics
+from src.log import get_logger
+from src.trace import TRACER
+from .journal import OP_ADD, OP_DONE, OP_POS, OP_REMOVE, OP_START, QueueJournal
+
+_queue_log = get_logger('queue')
+_play_log = get_logger('playback')
+
+_QUEUE_DEPTH = metrics.gauge('skyforge_queue_depth', '待播队列长度')
+_SONGS_STARTED = metrics.counter('skyforge_songs_started_total', '开始演奏的曲目数')
+_LOAD_FAILURES = metrics.counter('skyforge_sheet_load_failures_total', '乐谱加载失败次数')
+_SONG_GAP_SECONDS = metrics.histogram(
+    'skyforge_song_gap_seconds', '上一首结束到下一首开始的间隔 (秒)',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+@dataclass
+class SongRequest:
+    """点播请求"""
+    song_name: str      # 曲名
+    requester: str      # 点播者
+    file_path: Path     # 乐谱文件路径
+    trace_id: int = 0   # 追踪请求 ID (0 表示不追踪)
+    enqueued_ns: int = 0  # 提交时间 (time.perf_counter_ns)
+    id: int = 0         # 队列内唯一编号，提交时分配
+    position: int = 0   # 开始演奏的位置 (时间点序号)，用于重启后续播
+    uid: int = 0        # 点播者用户 ID (0 表示未知，按点播者名称识别)
+
+    def is_from(self, requester: str, uid: int = 0) -> bool:
+        """是否由该观众点播 (有用户 ID 时按 ID 识别，用户名可重复或改名)"""
+        return self.uid == uid if uid else self.requester == requester
+
+
+@dataclass
+class Transition:
+    """状态迁移记录"""
+    timestamp: float    # 发生时间 (time.perf_counter)
+    state: str          # 迁移后的状态
+    event: str          # 触发事件
+    song_name: str = "" # 相关曲目
+
+
+# 编排器状态
+STATE_IDLE = 'idle'          # 队列为空，等待点播
+STATE_LOADING = 'loading'    # 正在加载乐谱
+STATE_PLAYING = 'playing'    # 正在演奏
+STATE_PAUSED = 'paused'      # 已暂停
+
+# 内部指令
+_CMD_ENQUEUE = 'enqueue'
+_CMD_SKIP = 'skip'
+_CMD_COMPLETE = 'complete'
+_CMD_FAILED = 'failed'
+_CMD_SHOW_QUEUE = 'show_queue'
+_CMD_PAUSE = 'pause'
+_CMD_RESUME = 'resume'
+_CMD_REMOVE = 'remove'
+_CMD_CANCEL = 'cancel'
+_CMD_SHOW_POSITION = 'show_position'
+_CMD_VOTE_SKIP = 'vote_skip'
+_CMD_SHUTDOWN = 'shutdown'
+
+
+class PlaybackOrchestrator:
+    """播放编排器 - 单线程持有播放器和队列，按消息依次处理"""
+
+    # 播放位置写入日志的最小间隔 (秒)
+    POSITION_INTERVAL = 1.0
+
+    def __init__(self, player, history: int = 1000, journal: Optional[QueueJournal] = None,
+                 vote_skip_threshold: int = 3):
+        """初始化编排器
+
+        Args:
+            player: 播放器实例 (Player 或 ProcessPlayer)
+            history: 保留的状态迁移记录条数
+            journal: 队列日志 (可选)，启动时从中恢复队列和播放位置
+            vote_skip_threshold: 投票跳过当前曲目所需的票数
+        """
+        self.player = player
+        self.journal = journal
+        self.vote_skip_threshold = vote_skip_threshold
+        self._skip_votes: set[int | str] = set()  # 当前曲目的投票者 (用户 ID，未知时为用户名)
+        self._position_at = 0.0  # 上次写入播放位置的时间
+        self.transitions: deque[Transition] = deque(maxlen=history)
+        self._inbox: queue.Queue[tuple[str, Any]] = queue.Queue()
+        self._queue: deque[SongRequest] = deque()
+        self._current: Optional[SongRequest] = None
+        self._state = STATE_IDLE
+        self._lock = threading.Lock()  # 仅保护对外的只读快照
+        self._thread: Optional[threading.Thread] = None
+        self._finished_at: Optional[float] = None  # 上一首结束时间，用于统计曲间间隔
+        self._ids = itertools.count(1)
+        self._listeners: list[Callable[[], None]] = []
+        self.version = 0  # 每次状态或进度变化时递增
+
+        # 完成回调只投递消息，由编排线程接着处理
+        self.player.set_complete_callback(lambda: self._post(_CMD_COMPLETE))
+        self.player.set_progress_callback(self._on_progress)
+        # 流式加载时音符中的错误在播放过程中才会发现，由播放器在完成回调之前报告
+        self.player.set_error_callback(lambda message: self._post(_CMD_FAILED, message))
+
+    def start(self):
+        """启动编排线程"""
+        if self._thread:
+            return
+        self._record(STATE_IDLE, 'started')
+        if self.journal:
+            self._restore()
+        self._thread = threading.Thread(target=self._run, name='sky-forge-orchestrator', daemon=True)
+        self._thread.start()
+
+    def _restore(self):
+        """重放队列日志，恢复队列并从上次位置续播当前曲目"""
+        state = self.journal.replay()
+        entries = ([state.current] if state.current else []) + list(state.queue.values())
+        restored = [SongRequest(
+            song_name=entry['song'],
+            requester=entry['requester'],
+            file_path=Path(entry['path']),
+            id=entry['id'],
+            uid=entry.get('uid', 0),
+        ) for entry in entries]
+        if state.current and restored:
+            restored[0].position = state.position
+        self._ids = itertools.count(state.next_id)
+        self.journal.open()
+
+        if restored:
+            with self._lock:
+                self._queue.extend(restored)
+            _QUEUE_DEPTH.set(len(restored))
+            self._record(STATE_IDLE, 'restored')
+            _queue_log.info("已从日志恢复 %d 首点播", len(restored),
+                            extra={'fields': {'restored': len(restored), 'position': state.position}})
+            self._post(_CMD_COMPLETE)  # 由编排线程开始播放
+
+    def close(self, timeout: float = 2.0):
+        """停止编排线程"""
+        if not self._thread:
+            return
+        self._post(_CMD_SHUTDOWN)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        if self.journal:
+            self.journal.close()
+
+    # ---- 指令 (可在任意线程调用) ----
+
+    def submit(self, request: SongRequest):
+        """加入点播队列"""
+        request.id = next(self._ids)
+        request.enqueued_ns = time.perf_counter_ns()
+        self._post(_CMD_ENQUEUE, request)
+
+    def skip(self, requester: str = ""):
+        """跳过当前曲目"""
+        self._post(_CMD_SKIP, requester)
+
+    def show_queue(self):
+        """输出当前队列"""
+        self._post(_CMD_SHOW_QUEUE)
+
+    def pause(self):
+        """暂停当前曲目"""
+        self._post(_CMD_PAUSE)
+
+    def resume(self):
+        """继续当前曲目"""
+        self._post(_CMD_RESUME)
+
+    def remove(self, request_id: int):
+        """从队列中移除请求"""
+        self._post(_CMD_REMOVE, request_id)
+
+    def cancel(self, requester: str, uid: int = 0):
+        """取消点播者最近一次仍在队列中的请求"""
+        self._post(_CMD_CANCEL, (requester, uid))
+
+    def show_position(self, requester: str, uid: int = 0):
+        """输出点播者的排队位置"""
+        self._post(_CMD_SHOW_POSITION, (requester, uid))
+
+    def vote_skip(self, voter: str, uid: int = 0):
+        """投票跳过当前曲目 (同一观众只计一票)"""
+        self._post(_CMD_VOTE_SKIP, (voter, uid))
+
+    def add_listener(self, callback: Callable[[], None]):
+        """注册状态变化监听器
+
+        回调可能在编排线程或播放计时线程中调用，必须立即返回
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[], None]):
+        """移除状态变化监听器"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    # ---- 只读快照 ----
+
+    @property
+    def state(self) -> str:
+        """当前状态"""
+        return self._state
+
+    @property
+    def current(self) -> Optional[SongRequest]:
+        """正在演奏的请求"""
+        return self._current
+
+    @property
+    def progress(self) -> tuple[int, int]:
+        """当前曲目进度 (current, total)"""
+        return self.player.progress
+
+    @property
+    def queue_length(self) -> int:
+        """当前队列长度"""
+        with self._lock:
+            return len(self._queue)
+
+    def snapshot(self, offset: int = 0, limit: Optional[int] = None) -> list[SongRequest]:
+        """当前队列的副本
+
+        Args:
+            offset: 起始位置
+            limit: 最多返回条数，None 表示全部
+        """
+        end = None if limit is None else offset + limit
+        with self._lock:
+            return list(itertools.islice(self._queue, offset, end))
+
+    # ---- 编排线程 ----
+
+    def _post(self, cmd: str, arg: Any = None):
+        self._inbox.put((cmd, arg))
+
+    def _journal(self, op: str, request: SongRequest, **fields):
+        """写入队列日志"""
+        if self.journal:
+            self.journal.append({'op': op, 'id': request.id, **fields})
+
+    def _on_progress(self, current: int, total: int):
+        """播放进度 (在计时线程中调用)"""
+        request = self._current
+        if self.journal and request:
+            now = time.perf_counter()
+            if now - self._position_at >= self.POSITION_INTERVAL:
+                self._position_at = now
+                self._journal(OP_POS, request, idx=current)
+        self._notify()
+
+    def _notify(self):
+        """通知监听器状态已变化"""
+        self.version += 1
+        for callback in self._listeners:
+            callback()
+
+    def _record(self, state: str, event: str, request: Optional[SongRequest] = None):
+        """记录一次状态迁移"""
+        self._state = state
+        self.transitions.append(Transition(
+            timestamp=time.perf_counter(),
+            state=state,
+            event=event,
+            song_name=request.song_name if request else "",
+        ))
+        self._notify()
+
+    def _run(self):
+        """编排主循环"""
+        handlers = {
+            _CMD_ENQUEUE: self._handle_enqueue,
+            _CMD_SKIP: self._handle_skip,
+            _CMD_COMPLETE: self._handle_complete,
+            _CMD_FAILED: self._handle_failed,
+            _CMD_SHOW_QUEUE: self._handle_show_queue,
+            _CMD_PAUSE: self._handle_pause,
+            _CMD_RESUME: self._handle_resume,
+            _CMD_REMOVE: self._handle_remove,
+            _CMD_CANCEL: self._handle_cancel,
+            _CMD_SHOW_POSITION: self._handle_show_position,
+            _CMD_VOTE_SKIP: self._handle_vote_skip,
+        }
+        while True:
+            cmd, arg = self._inbox.get()
+            if cmd == _CMD_SHUTDOWN:
+                self._record(self._state, 'shutdown')
+                return
+            try:
+                if arg is None:
+                    handlers[cmd]()
+                else:
+                    handlers[cmd](arg)
+            except Exception as e:
+                _play_log.exception("处理指令 %s 失败: %s", cmd, e)
+
+    def _handle_enqueue(self, request: SongRequest):
+        with self._lock:
+            self._queue.append(request)
+            queue_pos = len(self._queue)
+        _QUEUE_DEPTH.set(queue_pos)
+        self._journal(OP_ADD, request, song=request.song_name, requester=request.requester,
+                      uid=request.uid, path=str(request.file_path))
+        self._record(self._state, 'enqueued', request)
+
+        _queue_log.info("%s 点播了 %s (队列位置: %d)", request.requester, request.song_name, queue_pos,
+                        extra={'fields': {'requester': request.requester, 'song': request.song_name,
+                                          'position': queue_pos}})
+
+        # 如果当前没有播放，立即开始
+        if self._current is None:
+            self._play_next()
+
+    def _handle_complete(self):
+        if self._current:
+            _play_log.info("演奏完成: %s", self._current.song_name,
+                           extra={'fields': {'song': self._current.song_name}})
+            self._journal(OP_DONE, self._current)
+            self._record(STATE_IDLE, 'completed', self._current)
+            self._current = None
+            self._finished_at = time.perf_counter()
+        self._play_next()
+
+    def _handle_failed(self, message: str):
+        """当前曲目播放中断，按加载失败处理，随后的完成回调接着播放下一首"""
+        request = self._current
+        if request is None:
+            return
+        TRACER.discard(request.trace_id)
+        self._journal(OP_DONE, request)
+        self._record(STATE_LOADING, 'load_failed', request)
+        _LOAD_FAILURES.inc()
+        _play_log.warning("加载乐谱失败: %s", message,
+                          extra={'fields': {'song': request.song_name, 'path': str(request.file_path)}})
+        self._current = None
+
+    def _handle_skip(self, requester: str = ""):
+        # 停止后播放器会回调完成，由 _handle_complete 接着播放下一首
+        if self._current and self.player.is_playing:
+            self._record(self._state, 'skipped', self._current)
+            self.player.stop()
+            _queue_log.info("%s 跳过了当前曲目", requester,
+                            extra={'fields': {'requester': requester, 'song': self._current.song_name}})
+
+    def _handle_pause(self):
+        if self._state == STATE_PLAYING:
+            self.player.pause()
+            self._record(STATE_PAUSED, 'paused', self._current)
+
+    def _handle_resume(self):
+        if self._state == STATE_PAUSED:
+            self.player.resume()
+            self._record(STATE_PLAYING, 'resumed', self._current)
+
+    def _handle_remove(self, request_id: int):
+        with self._lock:
+            request = next((r for r in self._queue if r.id == request_id), None)
+        if request:
+            self._remove(request, 'removed')
+
+    def _handle_cancel(self, viewer: tuple[str, int]):
+        requester, uid = viewer
+        with self._lock:
+            request = next((r for r in reversed(self._queue) if r.is_from(requester, uid)), None)
+        if request is None:
+            _queue_log.info("%s 没有待播的点播", requester, extra={'fields': {'requester': requester}})
+            return
+        self._remove(request, 'cancelled')
+
+    def _remove(self, request: SongRequest, event: str):
+        """从队列中移除请求"""
+        with self._lock:
+            self._queue.remove(request)
+            _QUEUE_DEPTH.set(len(self._queue))
+        self._journal(OP_REMOVE, request)
+        TRACER.discard(request.trace_id)
+        self._record(self._state, event, request)
+        _queue_log.info("已移除 %s (点播者: %s)", request.song_name, request.requester,
+                        extra={'fields': {'id': request.id, 'song': request.song_name,
+                                          'requester': request.requester}})
+
+    def _handle_show_position(self, viewer: tuple[str, int]):
+        requester, uid = viewer
+        with self._lock:
+            positions = [(i, req.song_name) for i, req in enumerate(self._queue, 1)
+                         if req.is_from(requester, uid)]
+        playing = self._current is not None and self._current.is_from(requester, uid)
+        if playing:
+            _queue_log.info("%s 点播的 %s 正在演奏", requester, self._current.song_name)
+        if positions:
+            _queue_log.info("%s 的点播: %s", requester,
+                            ", ".join(f"第 {i} 位 {song}" for i, song in positions),
+                            extra={'fields': {'requester': requester, 'positions': [i for i, _ in positions]}})
+        elif not playing:
+            _queue_log.info("%s 没有待播的点播", requester, extra={'fields': {'requester': requester}})
+
+    def _handle_vote_skip(self, viewer: tuple[str, int]):
+        voter, uid = viewer
+        if not (self._current and self.player.is_playing):
+            return
+        self._skip_votes.add(uid or voter)
+        votes = len(self._skip_votes)
+        _queue_log.info("%s 投票跳过 %s (%d/%d)", voter, self._current.song_name, votes,
+                        self.vote_skip_threshold,
+                        extra={'fields': {'voter': voter, 'song': self._current.song_name, 'votes': votes}})
+        if votes >= self.vote_skip_threshold:
+            self._handle_skip("投票")
+
+    def _handle_show_queue(self):
+        with self._lock:
+            if not self._queue:
+                _queue_log.info("当前队列为空")
+                return
+            lines = [f"共 {len(self._queue)} 首待播:"]
+            lines += [f"  {i}. {req.song_name} (点播者: {req.requester})"
+                      for i, req in enumerate(self._queue, 1)]
+        _queue_log.info("\n".join(lines))
+
+    def _play_next(self):
+        """播放队列中的下一首，加载失败时依次尝试后续曲目"""
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._current = None
+                    self._finished_at = None  # 空闲等待不计入曲间间隔
+                    self._record(STATE_IDLE, 'drained')
+                    _play_log.info("队列为空，等待点播...")
+                    return
+                request = self._queue.popleft()
+                self._current = request
+                self._skip_votes.clear()
+                _QUEUE_DEPTH.set(len(self._queue))
+
+            self._record(STATE_LOADING, 'dequeued', request)
+            TRACER.record('queue.wait', request.trace_id, request.enqueued_ns)
+            try:
+                # 流式加载: 只解析乐谱头部，音符在播放时边解析边演奏
+                with TRACER.span('load_sheet', request.trace_id):
+                    self.player.load_file(request.file_path, request.trace_id)
+                sheet = self.player.sheet
+                if request.position:
+                    self.player.seek(request.position)
+                self.player.play()
+            except Exception as e:
+                TRACER.discard(request.trace_id)
+                self._journal(OP_REMOVE, request)
+                self._journal(OP_DONE, request)
+                self._record(STATE_LOADING, 'load_failed', request)
+                _LOAD_FAILURES.inc()
+                _play_log.warning("加载乐谱失败: %s", e,
+                                  extra={'fields': {'song': request.song_name, 'path': str(request.file_path)}})
+                continue  # 尝试下一首
+
+            self._record(STATE_PLAYING, 'playing', request)
+            self._journal(OP_START, request)
+            if request.position:
+                self._journal(OP_POS, request, idx=request.position)
+            _SONGS_STARTED.inc()
+            if self._finished_at is not None:
+                _SONG_GAP_SECONDS.observe(time.perf_counter() - self._finished_at)
+                self._finished_at = None
+            _play_log.info("开始演奏: %s (点播者: %s)", sheet.name, request.requester,
+                           extra={'fields': {'song': sheet.name, 'requester': request.requester}})
+            return
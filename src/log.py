@@ -0,0 +1,171 @@
+"""
+日志模块
+日志记录先放入队列，由后台线程统一写控制台和 JSON Lines 文件，
+避免事件循环和计时线程阻塞在控制台输出上
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+# 根日志名
+ROOT_LOGGER = 'sky_forge'
+
+# 子系统 -> 控制台标签
+SUBSYSTEMS = {
+    'danmaku': '弹幕',
+    'queue': '队列',
+    'playback': '播放',
+}
+
+# 弹幕聊天回显使用的日志名，控制台输出会被限流
+CHAT_LOGGER = f'{ROOT_LOGGER}.danmaku.chat'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """获取子系统日志器
+
+    Args:
+        subsystem: 子系统名称，如 "danmaku"、"queue"、"playback"
+    """
+    return logging.getLogger(f'{ROOT_LOGGER}.{subsystem}')
+
+
+def parse_levels(spec: str) -> dict[str, int]:
+    """解析子系统日志级别
+
+    Args:
+        spec: 形如 "danmaku=WARNING,queue=DEBUG" 的字符串
+
+    Returns:
+        子系统 -> 日志级别
+    """
+    levels = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        subsystem, sep, level = item.partition('=')
+        if not sep:
+            raise ValueError(f"日志级别格式错误: {item}")
+        value = logging.getLevelName(level.strip().upper())
+        if not isinstance(value, int):
+            raise ValueError(f"未知日志级别: {level}")
+        levels[subsystem.strip()] = value
+    return levels
+
+
+class _ConsoleFormatter(logging.Formatter):
+    """控制台格式: [标签] 消息"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = record.name.split('.')
+        subsystem = parts[1] if len(parts) > 1 else record.name
+        return f"[{SUBSYSTEMS.get(subsystem, subsystem)}] {record.getMessage()}"
+
+
+class _JsonFormatter(logging.Formatter):
+    """JSON Lines 格式，附带 extra={'fields': {...}} 中的结构化字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name.removeprefix(f'{ROOT_LOGGER}.'),
+            'msg': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _RateLimitFilter(logging.Filter):
+    """令牌桶限流 - 只作用于指定日志器，超出部分直接丢弃"""
+
+    def __init__(self, name: str, rate: float, burst: int):
+        super().__init__()
+        self.target = name
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # 只在后台输出线程中调用，无需加锁
+        if record.name != self.target:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.dropped += 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """入队时不做格式化，把消息拼接留给后台线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(levels: Optional[dict[str, int]] = None,
+                  log_file: Optional[str | Path] = None,
+                  chat_rate: float = 5.0,
+                  default_level: int = logging.INFO):
+    """初始化日志管道
+
+    Args:
+        levels: 子系统 -> 日志级别，未指定的子系统使用 default_level
+        log_file: JSON Lines 日志文件路径（可选）
+        chat_rate: 控制台每秒最多回显的弹幕条数
+        default_level: 默认日志级别
+    """
+    global _listener
+    if _listener:
+        return
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(default_level)
+    root.propagate = False
+    for subsystem, level in (levels or {}).items():
+        get_logger(subsystem).setLevel(level)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(_ConsoleFormatter())
+    console.addFilter(_RateLimitFilter(CHAT_LOGGER, chat_rate, burst=max(1, int(chat_rate * 2))))
+    handlers: list[logging.Handler] = [console]
+
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setFormatter(_JsonFormatter())
+        handlers.append(file_handler)
+
+    # 热路径只做入队，格式化和 I/O 都在后台线程完成
+    records: queue.Queue = queue.Queue()
+    root.addHandler(_QueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """输出剩余日志并停止后台线程"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
@@ -4,12 +4,24 @@ Sky-Forge CLI 入口
 
 import argparse
 import asyncio
+import json
 import sys
+import time
+from dataclasses import asdict
 from pathlib import Path
 
-from src.player import Player
+from src import metrics
+from src.library import Catalog
+from src.library.catalog import SORT_FIELDS
+from src.library.analysis import analyze_library
+from src.library.importer import STATUS_FAILED, STATUS_OK, STATUS_SKIPPED, import_sheets
+from src.log import parse_levels, setup_logging
+from src.player import Player, ProcessPlayer
+from src.player.ensemble import EnsembleScheduler
+from src.player.keyboard import KeyboardController, set_cpu_affinity
 from src.player.sheet import load_sheet, scan_sheets
-from src.live import DanmakuClient, RequestHandler
+from src.trace import TRACER
+from src.live import ControlServer, DanmakuClient, QueueJournal, RequestHandler
 
 
 def get_sheets_dir() -> Path:
@@ -21,6 +33,24 @@ def get_sheets_dir() -> Path:
     return Path(__file__).parent.parent / 'sheets'
 
 
+def get_catalog_path() -> Path:
+    """获取曲库目录数据库路径"""
+    return get_sheets_dir() / 'catalog.db'
+
+
+def create_player(isolated: bool):
+    """创建播放器
+
+    Args:
+        isolated: 是否在独立子进程中运行播放计时循环
+    """
+    if isolated:
+        # CPU 亲和性仅设置在播放进程上
+        return ProcessPlayer()
+    set_cpu_affinity()
+    return Player()
+
+
 def cmd_list(args):
     """列出曲库"""
     sheets_dir = get_sheets_dir()
@@ -92,16 +122,8 @@ def cmd_play(args):
     print()
 
     # 创建播放器
-    player = Player()
-
-    def on_progress(current, total):
-        print(f"\r播放进度: {current}/{total}", end='', flush=True)
+    player = create_player(args.isolated)
 
-    def on_complete():
-        print("\n演奏完成!")
-
-    player.set_progress_callback(on_progress)
-    player.set_complete_callback(on_complete)
     player.load(sheet)
 
     print("按 Ctrl+C 停止播放")
@@ -109,12 +131,151 @@ def cmd_play(args):
 
     try:
         player.play()
-        # 等待播放完成
-        while player.is_playing:
-            __import__('time').sleep(0.1)
+        # 阻塞等待播放完成，期间在主线程刷新进度，不占用计时线程
+        while not player.wait(timeout=0.2):
+            current, total = player.progress
+            print(f"\r播放进度: {current}/{total}", end='', flush=True)
+        print("\n演奏完成!")
     except KeyboardInterrupt:
         print("\n已停止")
         player.stop()
+    finally:
+        player.close()
+
+
+def cmd_ensemble(args):
+    """多窗口合奏"""
+    # 加载各声部乐谱，单个乐谱可复制到多个窗口
+    try:
+        sheets = [load_sheet(path) for path in args.files]
+    except Exception as e:
+        print(f"加载乐谱失败: {e}")
+        return
+    if len(sheets) == 1 and args.copies > 1:
+        sheets = sheets * args.copies
+
+    set_cpu_affinity()
+    scheduler = EnsembleScheduler()
+    for i, sheet in enumerate(sheets, 1):
+        print(f"声部 {i}: {sheet.name} ({len(sheet.notes)} 个音符)")
+        keyboard = KeyboardController()
+        if not keyboard.select_window(f"请选择声部 {i} 的目标窗口"):
+            print("已取消")
+            return
+        scheduler.add_target(keyboard, sheet, offset_ms=args.offset * (i - 1))
+
+    print("按 Ctrl+C 停止合奏")
+    print("-" * 40)
+
+    try:
+        scheduler.play()
+        scheduler.wait()
+        print("合奏完成!")
+    except KeyboardInterrupt:
+        print("\n已停止")
+        scheduler.stop()
+
+
+def cmd_analyze(args):
+    """分析曲库，更新目录数据库"""
+    sheets_dir = get_sheets_dir()
+    catalog_path = get_catalog_path()
+
+    def progress(done, total):
+        print(f"\r分析进度: {done}/{total}", end='', flush=True)
+
+    with Catalog(catalog_path) as catalog:
+        analyzed, failed, removed = analyze_library(sheets_dir, catalog, full=args.full,
+                                                    progress=progress)
+        if analyzed or failed:
+            print()
+        print(f"分析 {analyzed} 首，失败 {failed} 首，移除 {removed} 条过期记录")
+        print(f"目录: {catalog_path} (共 {len(catalog)} 首)")
+
+
+def cmd_query(args):
+    """按难度、时长、密度筛选曲库"""
+    catalog_path = get_catalog_path()
+    if not catalog_path.exists():
+        print("曲库尚未分析，请先运行 analyze 命令")
+        return
+
+    with Catalog(catalog_path) as catalog:
+        results = catalog.query(
+            name=args.name,
+            max_duration_ms=int(args.max_duration * 1000) if args.max_duration is not None else None,
+            max_notes_per_second=args.max_nps,
+            max_peak_density=args.max_peak,
+            max_chord=args.max_chord,
+            min_interval_ms=args.min_interval,
+            sort=args.sort,
+            descending=args.desc,
+            limit=args.limit,
+        )
+
+    if not results:
+        print("没有符合条件的曲目")
+        return
+
+    print(f"共 {len(results)} 首曲目:\n")
+    for i, stats in enumerate(results, 1):
+        print(f"  {i:3d}. {stats.name}")
+        print(f"       时长 {stats.duration_ms / 1000:.1f}s  音符 {stats.note_count}  "
+              f"平均 {stats.notes_per_second:.2f}/s  峰值 {stats.peak_density}/s  "
+              f"和弦 {stats.max_chord}  最小间隔 {stats.min_interval_ms}ms")
+
+
+def cmd_import(args):
+    """批量导入并规范化乐谱"""
+    dest_dir = Path(args.dest) if args.dest else get_sheets_dir()
+    print(f"导入到: {dest_dir}")
+
+    counts = {STATUS_OK: 0, STATUS_SKIPPED: 0, STATUS_FAILED: 0}
+    warned = 0
+    failures = []
+    last_print = 0.0
+
+    def progress(done, total):
+        nonlocal last_print
+        now = time.monotonic()
+        if done == total or now - last_print >= 0.1:
+            last_print = now
+            print(f"\r导入进度: {done}/{total}  失败 {counts[STATUS_FAILED]}", end='', flush=True)
+
+    report = open(args.report, 'w', encoding='utf-8') if args.report else None
+    try:
+        for result in import_sheets(args.paths, dest_dir, workers=args.jobs,
+                                    overwrite=args.overwrite, progress=progress):
+            counts[result.status] += 1
+            if result.warnings:
+                warned += 1
+            if result.status == STATUS_FAILED:
+                failures.append(result)
+            # 错误报告: 逐条写出失败、跳过和带警告的文件
+            if report and (result.status != STATUS_OK or result.warnings):
+                report.write(json.dumps(asdict(result), ensure_ascii=False) + '\n')
+                report.flush()
+    except KeyboardInterrupt:
+        print("\n已中断")
+    finally:
+        if report:
+            report.close()
+
+    if not any(counts.values()):
+        print("没有找到可导入的文件 (.json / .txt)")
+        return
+
+    print()
+    print(f"成功 {counts[STATUS_OK]} 首 (其中 {warned} 首已自动修正)，"
+          f"跳过 {counts[STATUS_SKIPPED]} 首，失败 {counts[STATUS_FAILED]} 首")
+    for result in failures[:10]:
+        print(f"  {result.source}: {result.error}")
+    if len(failures) > 10:
+        print(f"  ... 另有 {len(failures) - 10} 个失败")
+    if args.report:
+        print(f"错误报告: {args.report}")
+    if counts[STATUS_OK]:
+        print("运行 analyze 命令更新曲库目录")
 
 
 def cmd_live(args):
@@ -128,15 +289,31 @@ def cmd_live(args):
     print()
 
     # 创建播放器和点播处理器
-    player = Player()
-    handler = RequestHandler(player, sheets_dir)
+    player = create_player(args.isolated)
+    journal = QueueJournal(args.journal) if args.journal else None
+    handler = RequestHandler(player, sheets_dir, journal, vote_skip_threshold=args.vote_skip)
 
     # 创建弹幕客户端
-    client = DanmakuClient(room_id, sessdata)
-    client.set_danmaku_handler(handler.handle_danmaku)
+    client = DanmakuClient(room_id, sessdata, echo_chat=args.echo_chat)
+    client.set_danmaku_handler(handler.handle_danmaku, handler.router.accepts)
+
+    # 指标服务 (Prometheus 文本格式)，同时提供请求追踪导出
+    metrics_server = None
+    if args.metrics_port:
+        routes = {
+            '/trace': lambda: ('application/json', json.dumps(TRACER.to_chrome_trace()).encode('utf-8')),
+        }
+        metrics_server = metrics.start_http_server(args.metrics_port, routes=routes)
+        print(f"指标服务: http://127.0.0.1:{args.metrics_port}/metrics")
+        print(f"请求追踪: http://127.0.0.1:{args.metrics_port}/trace")
 
     async def run():
+        # 控制/状态接口与弹幕客户端共用同一事件循环
+        api = (ControlServer(handler.orchestrator, port=args.api_port, token=args.api_token)
+               if args.api_port else None)
         try:
+            if api:
+                await api.start()
             await client.start()
             print("按 Ctrl+C 退出")
             print("-" * 40)
@@ -145,11 +322,21 @@ def cmd_live(args):
             pass
         finally:
             await client.stop()
+            if api:
+                await api.stop()
 
     try:
         asyncio.run(run())
     except KeyboardInterrupt:
         print("\n正在退出...")
+    finally:
+        handler.close()
+        player.close()
+        if metrics_server:
+            metrics_server.shutdown()
+        if args.trace_file:
+            TRACER.dump(args.trace_file)
+            print(f"请求追踪已写入: {args.trace_file}")
 
 
 def main():
@@ -157,6 +344,10 @@ def main():
         prog='sky-forge',
         description='光遇钢琴演奏工具'
     )
+    parser.add_argument('--log-file', help='JSON Lines 日志文件')
+    parser.add_argument('--log-level', default='',
+                        help='子系统日志级别，如 danmaku=WARNING,queue=DEBUG,playback=INFO')
+    parser.add_argument('--chat-rate', type=float, default=5.0, help='控制台每秒最多回显的弹幕条数')
     subparsers = parser.add_subparsers(dest='command', help='命令')
 
     # list 命令
@@ -166,18 +357,75 @@ def main():
     play_parser = subparsers.add_parser('play', help='播放乐谱')
     play_parser.add_argument('song', nargs='?', help='曲目名称或序号')
     play_parser.add_argument('-f', '--file', help='直接指定乐谱文件')
+    play_parser.add_argument('--isolated', action='store_true', help='在独立进程中运行播放计时')
+
+    # ensemble 命令
+    ensemble_parser = subparsers.add_parser('ensemble', help='多窗口合奏')
+    ensemble_parser.add_argument('files', nargs='+', help='各声部的乐谱文件')
+    ensemble_parser.add_argument('-n', '--copies', type=int, default=1,
+                                 help='只指定一个乐谱时，同时演奏的窗口数')
+    ensemble_parser.add_argument('--offset', type=int, default=0,
+                                 help='相邻声部的进入间隔 (毫秒)，用于卡农等轮唱')
+
+    # analyze 命令
+    analyze_parser = subparsers.add_parser('analyze', help='分析曲库，更新目录数据库')
+    analyze_parser.add_argument('--full', action='store_true', help='全部重新分析 (默认只分析新增或修改的乐谱)')
+
+    # query 命令
+    query_parser = subparsers.add_parser('query', help='按难度、时长、密度筛选曲库')
+    query_parser.add_argument('name', nargs='?', help='曲名包含的文字')
+    query_parser.add_argument('--max-duration', type=float, help='最长时长 (秒)')
+    query_parser.add_argument('--max-nps', type=float, help='平均每秒音符数上限')
+    query_parser.add_argument('--max-peak', type=int, help='任意 1 秒内音符数上限')
+    query_parser.add_argument('--max-chord', type=int, help='最大和弦音数上限')
+    query_parser.add_argument('--min-interval', type=int, help='最小起音间隔下限 (毫秒)')
+    query_parser.add_argument('--sort', default='name', choices=sorted(SORT_FIELDS), help='排序字段')
+    query_parser.add_argument('--desc', action='store_true', help='降序排列')
+    query_parser.add_argument('--limit', type=int, help='最多显示条数')
+
+    # import 命令
+    import_parser = subparsers.add_parser('import', help='批量导入并规范化乐谱 (支持多种社区格式)')
+    import_parser.add_argument('paths', nargs='+', help='乐谱文件或目录')
+    import_parser.add_argument('--dest', help='写入目录 (默认为曲库目录)')
+    import_parser.add_argument('-j', '--jobs', type=int, help='并行进程数 (默认为 CPU 核心数)')
+    import_parser.add_argument('--overwrite', action='store_true', help='覆盖已存在的乐谱')
+    import_parser.add_argument('--report', help='错误报告文件 (JSON Lines)')
 
     # live 命令
     live_parser = subparsers.add_parser('live', help='启动直播间点播模式')
     live_parser.add_argument('room_id', type=int, help='直播间ID')
     live_parser.add_argument('--sessdata', '-s', default='', help='B站登录cookie (SESSDATA)')
+    live_parser.add_argument('--isolated', action='store_true', help='在独立进程中运行播放计时')
+    live_parser.add_argument('--metrics-port', type=int, default=0,
+                             help='Prometheus 指标端口 (0 为关闭)，/trace 导出请求追踪')
+    live_parser.add_argument('--trace-file', help='退出时写出请求追踪 (Chrome/Perfetto trace JSON)')
+    live_parser.add_argument('--api-port', type=int, default=0, help='本地控制/状态接口端口 (0 为关闭)')
+    live_parser.add_argument('--api-token', help='控制接口令牌，设置后 POST/DELETE 需携带 X-Sky-Forge-Token 请求头')
+    live_parser.add_argument('--journal', help='点播队列日志文件，重启时恢复队列和播放位置')
+    live_parser.add_argument('--echo-chat', action='store_true',
+                             help='回显所有弹幕 (默认只回显指令，非指令弹幕走零开销快速路径)')
+    live_parser.add_argument('--vote-skip', type=int, default=3, help='投票跳过当前曲目所需的票数')
 
     args = parser.parse_args()
 
+    try:
+        levels = parse_levels(args.log_level)
+    except ValueError as e:
+        parser.error(str(e))
+    setup_logging(levels, args.log_file, args.chat_rate)
+
     if args.command in ('list', 'ls'):
         cmd_list(args)
     elif args.command == 'play':
         cmd_play(args)
+    elif args.command == 'ensemble':
+        cmd_ensemble(args)
+    elif args.command == 'analyze':
+        cmd_analyze(args)
+    elif args.command == 'query':
+        cmd_query(args)
+    elif args.command == 'import':
+        cmd_import(args)
     elif args.command == 'live':
         cmd_live(args)
     else:
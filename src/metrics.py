@@ -0,0 +1,213 @@
+"""
+指标模块
+计数器、仪表和固定分桶直方图，以 Prometheus 文本格式通过本地 HTTP 端口暴露
+每次记录只有一次加锁和一次二分查找，可在生产环境常开
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+# 延迟类直方图的默认分桶 (秒)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def collect(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {_format_value(self._value)}",
+        ]
+
+
+class Gauge:
+    """可增可减的瞬时值"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def collect(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self._value)}",
+        ]
+
+
+class Histogram:
+    """固定分桶直方图"""
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 最后一格为 +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def collect(self) -> list[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+        cumulative = 0
+        for le, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(le)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format_value(total)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_type: type, name: str, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_type(name, *args)
+            elif not isinstance(metric, metric_type):
+                raise ValueError(f"指标 {name} 已注册为 {type(metric).__name__}")
+            return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter, name, help)
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._register(Gauge, name, help)
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, buckets)
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str) -> Counter:
+    """在全局注册表中获取或创建计数器"""
+    return REGISTRY.counter(name, help)
+
+
+def gauge(name: str, help: str) -> Gauge:
+    """在全局注册表中获取或创建仪表"""
+    return REGISTRY.gauge(name, help)
+
+
+def histogram(name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    """在全局注册表中获取或创建直方图"""
+    return REGISTRY.histogram(name, help, buckets)
+
+
+def start_http_server(port: int, host: str = '127.0.0.1',
+                      registry: Optional[Registry] = None,
+                      routes: Optional[dict[str, Callable[[], tuple[str, bytes]]]] = None
+                      ) -> ThreadingHTTPServer:
+    """在后台线程启动指标 HTTP 服务 (GET /metrics)
+
+    Args:
+        port: 监听端口
+        host: 监听地址，默认只监听本机
+        registry: 指标注册表，默认使用全局注册表
+        routes: 额外的 GET 路由，路径 -> 返回 (Content-Type, 内容) 的函数
+
+    Returns:
+        HTTP 服务实例，调用 shutdown() 停止
+    """
+    registry = registry or REGISTRY
+    handlers = {
+        '/metrics': lambda: ('text/plain; version=0.0.4; charset=utf-8', registry.render().encode('utf-8')),
+        **(routes or {}),
+    }
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            route = handlers.get(self.path.split('?', 1)[0])
+            if route is None:
+                self.send_error(404)
+                return
+            content_type, body = route()
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # 不输出访问日志
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='sky-forge-metrics', daemon=True).start()
+    return server
@@ -1,6 +1,7 @@
 """Sky-Forge 乐谱播放模块"""
 
 from .controller import Player
+from .process import ProcessPlayer
 from .sheet import Sheet
 
-__all__ = ["Player", "Sheet"]
+__all__ = ["Player", "ProcessPlayer", "Sheet"]
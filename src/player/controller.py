@@ -5,11 +5,20 @@
 
 import threading
 import time
-from collections import defaultdict
-from typing import Callable, Optional
+from pathlib import Path
+from typing import Callable, Iterator, Optional
 
+from src import metrics
+from src.log import get_logger
 from src.player.keyboard import KeyboardController
-from src.player.sheet import Sheet
+from src.player.sheet import Sheet, compile_timeline, load_sheet
+from src.player.stream import SheetOrderError, TimelineBuffer
+from src.trace import TRACER
+
+# 音符实际按下时间相对目标时间的延迟
+NOTE_LATENESS = metrics.histogram('skyforge_note_lateness_seconds', '音符按下时间相对目标时间的延迟 (秒)')
+
+_log = get_logger('playback')
 
 
 class Player:
@@ -18,19 +27,55 @@ class Player:
     def __init__(self, keyboard: Optional[KeyboardController] = None):
         self.keyboard = keyboard or KeyboardController()
         self.sheet: Optional[Sheet] = None
-        self._thread: Optional[threading.Thread] = None
+        self._stream_path: Optional[Path] = None      # 流式加载的乐谱文件
+        self._buffer: Optional[TimelineBuffer] = None  # 已打开、尚未开始播放的流式缓冲
+        self._worker: Optional[threading.Thread] = None
+        self._start_event = threading.Event()  # 唤醒常驻播放线程
+        self._idle_event = threading.Event()   # 当前没有播放任务
+        self._idle_event.set()
+        self._closed = False
         self._stop_event = threading.Event()
         self._pause_event = threading.Event()
         self._pause_event.set()  # 初始未暂停
         self._current_idx = 0
+        self._total = 0
         self._is_playing = False
+        self._trace_id = 0
+        self._play_ns = 0
         self._on_progress: Optional[Callable[[int, int], None]] = None
         self._on_complete: Optional[Callable[[], None]] = None
+        self._on_error: Optional[Callable[[str], None]] = None
+
+    def load(self, sheet: Sheet, trace_id: int = 0):
+        """加载乐谱
 
-    def load(self, sheet: Sheet):
-        """加载乐谱"""
+        Args:
+            sheet: 乐谱
+            trace_id: 追踪请求 ID，首个音符按下时结束该请求
+        """
+        self._release_buffer()
+        self._stream_path = None
         self.sheet = sheet
         self._current_idx = 0
+        self._trace_id = trace_id
+
+    def load_file(self, file_path: str | Path, trace_id: int = 0):
+        """流式加载乐谱文件
+
+        只解析到音符数组开头即返回，播放时后台边解析边演奏，
+        首个音符不必等待整个文件解码，内存只占用预读窗口
+
+        Args:
+            file_path: 乐谱文件路径
+            trace_id: 追踪请求 ID，首个音符按下时结束该请求
+
+        Raises:
+            ValueError: 文件不是可识别的乐谱格式
+        """
+        buffer = TimelineBuffer(file_path)
+        self.load(buffer.sheet, trace_id)
+        self._stream_path = Path(file_path)
+        self._buffer = buffer
 
     def set_progress_callback(self, callback: Callable[[int, int], None]):
         """设置进度回调 (current, total)"""
@@ -40,6 +85,10 @@ class Player:
         """设置完成回调"""
         self._on_complete = callback
 
+    def set_error_callback(self, callback: Callable[[str], None]):
+        """设置播放中断回调 (流式解析出错等)，在完成回调之前调用"""
+        self._on_error = callback
+
     @property
     def is_playing(self) -> bool:
         return self._is_playing
@@ -48,6 +97,11 @@ class Player:
     def is_paused(self) -> bool:
         return not self._pause_event.is_set()
 
+    @property
+    def progress(self) -> tuple[int, int]:
+        """当前进度 (current, total)"""
+        return self._current_idx, self._total
+
     def play(self):
         """开始/继续播放"""
         if not self.sheet:
@@ -66,51 +120,108 @@ class Player:
             if not self.keyboard.find_game_window():
                 raise RuntimeError("未找到光遇游戏窗口")
 
-        # 开始新播放
+        # 开始新播放 (交给常驻播放线程，不再每首曲目新建线程)
+        self._play_ns = time.perf_counter_ns()
         self._stop_event.clear()
         self._pause_event.set()
         self._is_playing = True
-        self._thread = threading.Thread(target=self._play_loop, daemon=True)
-        self._thread.start()
+        self._idle_event.clear()
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run_worker, name='sky-forge-player', daemon=True)
+            self._worker.start()
+        self._start_event.set()
+
+    def _run_worker(self):
+        """常驻播放线程 - 依次执行每次播放任务"""
+        while True:
+            self._start_event.wait()
+            self._start_event.clear()
+            if self._closed:
+                return
+            try:
+                self._play_loop()
+            except Exception as e:
+                # 完成回调等抛出的异常不能终止常驻播放线程
+                _log.exception("播放线程异常: %s", e)
 
     def _play_loop(self):
         """播放循环 - 使用绝对时间计时"""
         assert self.sheet is not None  # 类型收窄
         assert self.sheet.notes is not None  # 确保 notes 非空
 
-        # 按时间分组音符
-        notes_by_time = defaultdict(list)
-        for note in self.sheet.notes:
-            notes_by_time[note.time].append(note.key)
-
-        sorted_times = sorted(notes_by_time.keys())
-        total = len(sorted_times)
-
-        if total == 0:
-            self._is_playing = False
-            if self._on_complete:
-                self._on_complete()
-            return
-
-        # 记录歌曲开始时间（绝对时间）
-        # 直接使用乐谱中的时间，不做 BPM 调整
-        song_start_time = time.perf_counter()
-
-        for idx in range(self._current_idx, total):
+        buffer = None
+        try:
+            if self._stream_path:
+                # 流式播放: 重播时重新打开文件
+                buffer = self._buffer or TimelineBuffer(self._stream_path)
+                self._buffer = None
+                buffer.start()
+                self._total = 0
+                entries = self._stream_entries(buffer, self._current_idx)
+            else:
+                # 按时间分组音符
+                timeline = compile_timeline(self.sheet)
+                self._total = len(timeline)
+                entries = enumerate(timeline[self._current_idx:], self._current_idx)
+            self._play_entries(entries)
+        except (OSError, ValueError) as e:
+            _log.error("播放中断: %s", e)
+            self._report_error(str(e))
+        except Exception as e:
+            _log.exception("播放异常: %s", e)
+            self._report_error(str(e))
+        finally:
+            if buffer:
+                buffer.close()
+            # 任何情况下都要结束本次播放，否则调用方收不到完成回调
+            self._finish()
+
+    def _stream_entries(self, buffer: TimelineBuffer, start: int) -> Iterator[tuple[int, tuple[int, list[str]]]]:
+        """从流式缓冲依次取出时间点，跳过 start 之前的部分
+
+        乐谱乱序超出预读窗口时改为完整加载，从最后演奏的时间点之后继续
+        """
+        idx = 0
+        played_ms = -1  # 已演奏 (或跳过) 的最后一个时间点
+        try:
+            while (entry := buffer.get()) is not None:
+                self._total = buffer.produced
+                if idx >= start:
+                    yield idx, entry
+                played_ms = entry[0]
+                idx += 1
+        except SheetOrderError as e:
+            _log.warning("乐谱音符未按时间排序，改为完整加载: %s", e)
+            timeline = compile_timeline(load_sheet(self._stream_path))
+            self._total = len(timeline)
+            for idx, entry in enumerate(timeline):
+                if entry[0] > played_ms:
+                    yield idx, entry
+
+    def _play_entries(self, entries: Iterator[tuple[int, tuple[int, list[str]]]]):
+        """按绝对时间依次演奏时间点"""
+        # 直接使用乐谱中的时间，不做 BPM 调整；以第一个演奏的时间点对齐 (支持从中途开始)
+        song_start_time = None
+
+        for idx, (note_time_ms, keys) in entries:
             if self._stop_event.is_set():
                 break
 
-            # 等待恢复
-            while not self._pause_event.is_set():
-                if self._stop_event.is_set():
-                    break
-                time.sleep(0.05)
+            # 等待恢复 (stop 会同时放行暂停)，并顺延暂停的时长
+            if not self._pause_event.is_set():
+                paused_at = time.perf_counter()
+                self._pause_event.wait()
+                if song_start_time is not None:
+                    song_start_time += time.perf_counter() - paused_at
 
             if self._stop_event.is_set():
                 break
 
+            # 记录歌曲开始时间（绝对时间）
+            if song_start_time is None:
+                song_start_time = time.perf_counter() - note_time_ms / 1000.0
+
             # 当前音符的绝对时间点 (毫秒转秒)
-            note_time_ms = sorted_times[idx]
             target_time = song_start_time + note_time_ms / 1000.0
 
             # 等待到达目标时间点
@@ -120,19 +231,54 @@ class Player:
                 time.sleep(wait_time)
 
             # 播放音符
-            keys = notes_by_time[note_time_ms]
+            pressed_ns = time.perf_counter_ns()
+            NOTE_LATENESS.observe(max(pressed_ns / 1e9 - target_time, 0.0))
             self.keyboard.press_notes(keys)
 
+            # 首个音符: 结束请求追踪
+            if self._trace_id:
+                TRACER.record('player.startup', self._trace_id, self._play_ns, pressed_ns)
+                TRACER.finish(self._trace_id, end_ns=pressed_ns)
+                self._trace_id = 0
+
             # 进度回调
             if self._on_progress:
-                self._on_progress(idx + 1, total)
+                self._on_progress(idx + 1, self._total)
 
             self._current_idx = idx + 1
 
+    def _finish(self):
+        """结束本次播放并触发完成回调"""
+        TRACER.discard(self._trace_id)
+        self._trace_id = 0
         self._is_playing = False
+        self._current_idx = 0
+        self._idle_event.set()
         if self._on_complete:
             self._on_complete()
 
+    def _report_error(self, message: str):
+        """通知调用方本次播放因错误中断"""
+        if self._on_error:
+            try:
+                self._on_error(message)
+            except Exception as e:
+                _log.exception("播放中断回调异常: %s", e)
+
+    def _release_buffer(self):
+        """关闭未使用的流式缓冲"""
+        if self._buffer:
+            self._buffer.close()
+            self._buffer = None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待当前播放结束
+
+        Returns:
+            播放是否已结束 (超时返回 False)
+        """
+        return self._idle_event.wait(timeout)
+
     def pause(self):
         """暂停"""
         self._pause_event.clear()
@@ -141,11 +287,24 @@ class Player:
         """继续"""
         self._pause_event.set()
 
+    def seek(self, idx: int):
+        """跳转到第 idx 个时间点 (需在 play 之前调用)"""
+        self._current_idx = idx
+
     def stop(self):
         """停止"""
         self._stop_event.set()
         self._pause_event.set()  # 确保不会卡在暂停
         self._current_idx = 0
-        if self._thread:
-            self._thread.join(timeout=1.0)
-            self._thread = None
+        if self._is_playing:
+            self._idle_event.wait(timeout=1.0)
+
+    def close(self):
+        """停止播放并退出常驻播放线程"""
+        self.stop()
+        self._release_buffer()
+        self._closed = True
+        self._start_event.set()
+        if self._worker:
+            self._worker.join(timeout=1.0)
+            self._worker = None
@@ -0,0 +1,157 @@
+"""
+合奏调度器
+单个计时线程按共享时钟驱动多个游戏窗口，
+各声部的时间轴通过小顶堆合并，按键的按下和释放都作为事件调度，不阻塞计时线程
+"""
+
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.player.controller import NOTE_LATENESS
+from src.player.keyboard import KeyboardController
+from src.player.sheet import Sheet, compile_timeline
+
+# 事件类型：同一时间点先释放再按下
+_KEY_UP = 0
+_KEY_DOWN = 1
+
+
+@dataclass
+class EnsembleTarget:
+    """合奏声部"""
+    keyboard: KeyboardController            # 目标窗口的键盘控制器
+    timeline: list[tuple[int, list[str]]]   # 编译后的时间轴
+    offset_ms: int = 0                      # 相对共享时钟的偏移 (毫秒)
+    cursor: int = 0                         # 下一个待调度的时间点
+
+
+class EnsembleScheduler:
+    """合奏调度器 - 一个线程驱动任意数量的输出窗口"""
+
+    def __init__(self, press_duration: float = 0.05, lead_in: float = 0.1):
+        """初始化调度器
+
+        Args:
+            press_duration: 每个音符按住的时长 (秒)
+            lead_in: 开始前的准备时间 (秒)，保证所有声部从同一时刻起步
+        """
+        self.press_duration = press_duration
+        self.lead_in = lead_in
+        self.targets: list[EnsembleTarget] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._idle_event = threading.Event()
+        self._idle_event.set()
+        self._on_complete: Optional[Callable[[], None]] = None
+
+    def add_target(self, keyboard: KeyboardController, sheet: Sheet, offset_ms: int = 0) -> int:
+        """添加声部
+
+        Args:
+            keyboard: 已设置目标窗口的键盘控制器
+            sheet: 该声部演奏的乐谱
+            offset_ms: 相对共享时钟的偏移 (毫秒)，正值表示延后进入
+
+        Returns:
+            声部序号
+        """
+        if self.is_playing:
+            raise RuntimeError("演奏中不能添加声部")
+        if not keyboard.hwnd:
+            raise RuntimeError("未设置目标窗口")
+        self.targets.append(EnsembleTarget(keyboard, compile_timeline(sheet), offset_ms))
+        return len(self.targets) - 1
+
+    def set_complete_callback(self, callback: Callable[[], None]):
+        """设置完成回调"""
+        self._on_complete = callback
+
+    @property
+    def is_playing(self) -> bool:
+        return not self._idle_event.is_set()
+
+    def play(self):
+        """开始合奏"""
+        if self.is_playing:
+            return
+        if not self.targets:
+            raise RuntimeError("未添加声部")
+
+        self._stop_event.clear()
+        self._idle_event.clear()
+        self._thread = threading.Thread(target=self._run, name='sky-forge-ensemble', daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待合奏结束
+
+        Returns:
+            是否已结束 (超时返回 False)
+        """
+        return self._idle_event.wait(timeout)
+
+    def stop(self):
+        """停止合奏"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _push_next(self, heap: list, seq: int, idx: int) -> int:
+        """将声部的下一个时间点放入堆"""
+        target = self.targets[idx]
+        if target.cursor < len(target.timeline):
+            note_time_ms, keys = target.timeline[target.cursor]
+            target.cursor += 1
+            heapq.heappush(heap, ((note_time_ms + target.offset_ms) / 1000.0, _KEY_DOWN, seq, idx, keys))
+            seq += 1
+        return seq
+
+    def _run(self):
+        """调度循环 - 共享时钟，绝对时间计时"""
+        heap: list[tuple[float, int, int, int, list[str]]] = []
+        seq = 0
+        for idx, target in enumerate(self.targets):
+            target.cursor = 0
+            seq = self._push_next(heap, seq, idx)
+
+        start_time = time.perf_counter() + self.lead_in
+
+        while heap and not self._stop_event.is_set():
+            event_time, kind, _, idx, keys = heap[0]
+            target_time = start_time + event_time
+            wait_time = target_time - time.perf_counter()
+            if wait_time > 0:
+                # 长等待分段进行，以便及时响应停止
+                time.sleep(min(wait_time, 0.05))
+                continue
+
+            heapq.heappop(heap)
+            target = self.targets[idx]
+            if kind == _KEY_UP:
+                target.keyboard.notes_up(keys)
+                continue
+
+            NOTE_LATENESS.observe(max(time.perf_counter() - target_time, 0.0))
+            target.keyboard.notes_down(keys)
+
+            # 释放时间不晚于该声部的下一个音符
+            release = event_time + self.press_duration
+            if target.cursor < len(target.timeline):
+                next_time = (target.timeline[target.cursor][0] + target.offset_ms) / 1000.0
+                release = min(release, next_time)
+            heapq.heappush(heap, (release, _KEY_UP, seq, idx, keys))
+            seq += 1
+            seq = self._push_next(heap, seq, idx)
+
+        # 停止时释放所有仍按住的键
+        for _, kind, _, idx, keys in heap:
+            if kind == _KEY_UP:
+                self.targets[idx].keyboard.notes_up(keys)
+
+        self._idle_event.set()
+        if self._on_complete:
+            self._on_complete()
@@ -13,14 +13,7 @@ import win32con
 import win32gui
 import win32process
 
-from typing import Optional
-
-# 设置 CPU 亲和性（避开核心 0，避免与游戏冲突）
-_process = psutil.Process(os.getpid())
-_all_cores = list(range(psutil.cpu_count()))
-_cores_to_use = [core for core in _all_cores if core != 0]
-if _cores_to_use:
-    _process.cpu_affinity(_cores_to_use)
+from typing import Iterable, Optional
 
 # Windows API
 _user32 = ctypes.windll.user32
@@ -54,6 +47,18 @@ NOTE_TO_KEY = {
 }
 
 
+def set_cpu_affinity(exclude: Iterable[int] = (0,)):
+    """设置当前进程的 CPU 亲和性（默认避开核心 0，避免与游戏冲突）
+
+    Args:
+        exclude: 需要避开的核心编号
+    """
+    excluded = set(exclude)
+    cores = [core for core in range(psutil.cpu_count()) if core not in excluded]
+    if cores:
+        psutil.Process(os.getpid()).cpu_affinity(cores)
+
+
 def _set_us_keyboard_layout():
     """设置美式键盘布局"""
     _user32.LoadKeyboardLayoutW.argtypes = [ctypes.c_wchar_p, ctypes.c_uint]
@@ -186,9 +191,24 @@ class KeyboardController:
         time.sleep(duration)
         self.key_up(key)
 
+    @staticmethod
+    def _note_keys(notes: list[str]) -> list[str]:
+        """音符标识转换为键盘按键，忽略未知音符"""
+        return [NOTE_TO_KEY[note] for note in notes if note in NOTE_TO_KEY]
+
+    def notes_down(self, notes: list[str]):
+        """按下多个音符 (不释放)"""
+        for key in self._note_keys(notes):
+            self.key_down(key)
+
+    def notes_up(self, notes: list[str]):
+        """释放多个音符"""
+        for key in self._note_keys(notes):
+            self.key_up(key)
+
     def press_notes(self, notes: list[str], duration: float = 0.05):
         """同时按下多个音符 (和弦)"""
-        keys = [NOTE_TO_KEY.get(note) for note in notes if NOTE_TO_KEY.get(note)]
+        keys = self._note_keys(notes)
         if not keys:
             return
 
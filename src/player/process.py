@@ -0,0 +1,377 @@
+"""
+独立进程播放器
+在专用子进程中运行计时循环，与直播弹幕、网络解压、日志输出等隔离 GIL
+主进程通过管道下发编译好的时间轴和控制指令，子进程回传状态与进度
+"""
+
+import multiprocessing
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from src.log import get_logger
+from src.player.controller import NOTE_LATENESS
+from src.player.keyboard import KeyboardController, set_cpu_affinity
+from src.player.sheet import Sheet, compile_timeline, load_sheet
+from src.trace import TRACER
+
+# 主进程 -> 子进程指令
+CMD_LOAD = 'load'        # (CMD_LOAD, timeline)
+CMD_PLAY = 'play'        # (CMD_PLAY,)
+CMD_PAUSE = 'pause'      # (CMD_PAUSE,)
+CMD_RESUME = 'resume'    # (CMD_RESUME,)
+CMD_STOP = 'stop'        # (CMD_STOP,)
+CMD_SEEK = 'seek'        # (CMD_SEEK, idx)
+CMD_QUIT = 'quit'        # (CMD_QUIT,)
+
+# 子进程 -> 主进程状态
+EVT_PROGRESS = 'progress'    # (EVT_PROGRESS, current, total, lateness, pressed_ns)
+EVT_COMPLETE = 'complete'    # (EVT_COMPLETE,)
+EVT_ERROR = 'error'          # (EVT_ERROR, message)
+
+_log = get_logger('playback')
+
+
+class _Engine:
+    """子进程内的播放引擎 - 使用绝对时间计时，等待期间监听指令"""
+
+    def __init__(self, conn, keyboard: KeyboardController):
+        self.conn = conn
+        self.keyboard = keyboard
+        self.timeline: list[tuple[int, list[str]]] = []
+        self.idx = 0
+        self.playing = False
+        self.paused = False
+        self.pause_at = 0.0
+        self.start_time = 0.0  # 时间轴零点对应的 perf_counter
+
+    def run(self):
+        """主循环，直到收到退出指令"""
+        while True:
+            if self.playing and not self.paused:
+                if self.idx >= len(self.timeline):
+                    self._finish()
+                    continue
+
+                note_time_ms, keys = self.timeline[self.idx]
+                target_time = self.start_time + note_time_ms / 1000.0
+                wait_time = target_time - time.perf_counter()
+
+                # 等待到达目标时间点，期间有指令到达则先处理
+                if self.conn.poll(max(wait_time, 0)):
+                    if not self._handle(self.conn.recv()):
+                        return
+                    continue
+
+                pressed_ns = time.perf_counter_ns()
+                lateness = max(pressed_ns / 1e9 - target_time, 0.0)
+                self.keyboard.press_notes(keys)
+                self.idx += 1
+                self.conn.send((EVT_PROGRESS, self.idx, len(self.timeline), lateness, pressed_ns))
+            else:
+                if not self._handle(self.conn.recv()):
+                    return
+
+    def _finish(self):
+        """结束当前播放"""
+        self.playing = False
+        self.paused = False
+        self.idx = 0
+        self.conn.send((EVT_COMPLETE,))
+
+    def _rebase(self):
+        """以当前位置为起点重新对齐时间轴"""
+        if self.idx < len(self.timeline):
+            self.start_time = time.perf_counter() - self.timeline[self.idx][0] / 1000.0
+
+    def _handle(self, cmd: tuple) -> bool:
+        """处理指令，返回 False 表示退出"""
+        op = cmd[0]
+        if op == CMD_LOAD:
+            self.timeline = cmd[1]
+            self.idx = 0
+        elif op == CMD_PLAY:
+            if not self.playing:
+                self.playing = True
+                self.paused = False
+                self._rebase()
+        elif op == CMD_PAUSE:
+            if self.playing and not self.paused:
+                self.paused = True
+                self.pause_at = time.perf_counter()
+        elif op == CMD_RESUME:
+            if self.paused:
+                self.paused = False
+                # 顺延暂停的时长，保持剩余节奏不变
+                self.start_time += time.perf_counter() - self.pause_at
+        elif op == CMD_SEEK:
+            self.idx = max(0, min(cmd[1], len(self.timeline)))
+            if self.playing and not self.paused:
+                self._rebase()
+            elif self.paused:
+                self.pause_at = time.perf_counter()
+                self._rebase()
+        elif op == CMD_STOP:
+            if self.playing:
+                self._finish()
+            self.idx = 0
+        elif op == CMD_QUIT:
+            return False
+        return True
+
+
+def _engine_main(conn, hwnd: int, exclude_cores: tuple[int, ...]):
+    """子进程入口"""
+    # 亲和性只作用于播放进程
+    set_cpu_affinity(exclude_cores)
+
+    keyboard = KeyboardController()
+    keyboard.set_window(hwnd)
+
+    try:
+        _Engine(conn, keyboard).run()
+    except (EOFError, KeyboardInterrupt):
+        pass  # 主进程已退出
+    except Exception as e:
+        conn.send((EVT_ERROR, str(e)))
+    finally:
+        conn.close()
+
+
+class ProcessPlayer:
+    """独立进程播放控制器 - 接口与 Player 一致"""
+
+    def __init__(self, keyboard: Optional[KeyboardController] = None,
+                 exclude_cores: Iterable[int] = (0,)):
+        """初始化播放器
+
+        Args:
+            keyboard: 键盘控制器，仅用于在主进程中选择目标窗口
+            exclude_cores: 播放进程需要避开的 CPU 核心
+        """
+        self.keyboard = keyboard or KeyboardController()
+        self.exclude_cores = tuple(exclude_cores)
+        self.sheet: Optional[Sheet] = None
+        self._pending_timeline: list[tuple[int, list[str]]] = []
+        self._process: Optional[multiprocessing.process.BaseProcess] = None
+        self._conn = None
+        self._listener: Optional[threading.Thread] = None
+        self._send_lock = threading.Lock()
+        self._idle_event = threading.Event()
+        self._idle_event.set()
+        self._current_idx = 0
+        self._total = 0
+        self._is_playing = False
+        self._is_paused = False
+        self._trace_id = 0
+        self._play_ns = 0
+        self._on_progress: Optional[Callable[[int, int], None]] = None
+        self._on_complete: Optional[Callable[[], None]] = None
+        self._on_error: Optional[Callable[[str], None]] = None
+
+    def load(self, sheet: Sheet, trace_id: int = 0):
+        """加载乐谱（在主进程编译时间轴后下发）
+
+        Args:
+            sheet: 乐谱
+            trace_id: 追踪请求 ID，首个音符按下时结束该请求
+        """
+        timeline = compile_timeline(sheet)
+        self.sheet = sheet
+        self._trace_id = trace_id
+        self._current_idx = 0
+        self._total = len(timeline)
+        self._pending_timeline = timeline
+        if self._process:
+            self._send((CMD_LOAD, timeline))
+
+    def load_file(self, file_path: str | Path, trace_id: int = 0):
+        """从文件加载乐谱
+
+        播放进程只接收编译好的时间轴，因此在主进程完整解析后下发，
+        与 Player.load_file 接口一致
+        """
+        self.load(load_sheet(file_path), trace_id)
+
+    def set_progress_callback(self, callback: Callable[[int, int], None]):
+        """设置进度回调 (current, total)"""
+        self._on_progress = callback
+
+    def set_complete_callback(self, callback: Callable[[], None]):
+        """设置完成回调"""
+        self._on_complete = callback
+
+    def set_error_callback(self, callback: Callable[[str], None]):
+        """设置播放进程异常回调"""
+        self._on_error = callback
+
+    @property
+    def is_playing(self) -> bool:
+        return self._is_playing
+
+    @property
+    def is_paused(self) -> bool:
+        return self._is_paused
+
+    @property
+    def progress(self) -> tuple[int, int]:
+        """当前进度 (current, total)"""
+        return self._current_idx, self._total
+
+    def play(self):
+        """开始/继续播放"""
+        if not self.sheet:
+            raise RuntimeError("未加载乐谱")
+
+        if self._is_playing and not self._is_paused:
+            return  # 已在播放
+
+        if self._is_paused:
+            self.resume()
+            return
+
+        # 查找游戏窗口 (交互式选择只能在主进程完成)
+        if not self.keyboard.hwnd:
+            if not self.keyboard.find_game_window():
+                raise RuntimeError("未找到光遇游戏窗口")
+
+        if self._process and not self._process.is_alive():
+            self._release_process(self._conn)  # 播放进程已退出，重新启动
+        if not self._process:
+            self._start_process()
+
+        self._is_playing = True
+        self._play_ns = time.perf_counter_ns()
+        self._idle_event.clear()
+        self._send((CMD_PLAY,))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待当前播放结束
+
+        Returns:
+            播放是否已结束 (超时返回 False)
+        """
+        return self._idle_event.wait(timeout)
+
+    def pause(self):
+        """暂停"""
+        if self._is_playing:
+            self._is_paused = True
+            self._send((CMD_PAUSE,))
+
+    def resume(self):
+        """继续"""
+        if self._is_paused:
+            self._is_paused = False
+            self._send((CMD_RESUME,))
+
+    def seek(self, idx: int):
+        """跳转到第 idx 个时间点"""
+        self._current_idx = idx
+        if self._process:
+            self._send((CMD_SEEK, idx))
+
+    def stop(self):
+        """停止"""
+        self._is_paused = False
+        self._current_idx = 0
+        if self._process and self._is_playing:
+            self._send((CMD_STOP,))
+            self._idle_event.wait(timeout=1.0)
+
+    def close(self):
+        """关闭播放进程"""
+        if not self._process:
+            return
+        self._send((CMD_QUIT,))
+        self._release_process(self._conn, timeout=2.0)
+
+    def _start_process(self):
+        """启动播放进程并下发当前时间轴"""
+        ctx = multiprocessing.get_context('spawn')
+        parent_conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=_engine_main,
+            args=(child_conn, self.keyboard.hwnd, self.exclude_cores),
+            name='sky-forge-player',
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+        self._listener = threading.Thread(target=self._listen, args=(parent_conn,), daemon=True)
+        self._listener.start()
+
+        self._send((CMD_LOAD, self._pending_timeline))
+        if self._current_idx:
+            self._send((CMD_SEEK, self._current_idx))
+
+    def _send(self, cmd: tuple):
+        """向播放进程发送指令
+
+        播放进程已退出时忽略: 时间轴和播放位置保存在主进程，下次 play 重启进程时重新下发
+        """
+        with self._send_lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.send(cmd)
+            except (OSError, EOFError):
+                _log.warning("播放进程已退出，指令 %s 未送达", cmd[0])
+
+    def _release_process(self, conn, timeout: float = 1.0):
+        """回收播放进程并清理连接 (conn 不是当前连接时说明已被回收)"""
+        with self._send_lock:
+            if conn is None or conn is not self._conn:
+                return
+            process, self._process, self._conn = self._process, None, None
+        process.join(timeout=timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=timeout)
+        conn.close()
+
+    def _listen(self, conn):
+        """接收播放进程回传的状态"""
+        while True:
+            try:
+                event = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            kind = event[0]
+            if kind == EVT_PROGRESS:
+                self._current_idx, self._total = event[1], event[2]
+                NOTE_LATENESS.observe(event[3])
+                if self._trace_id:
+                    # perf_counter 为系统级单调时钟，子进程的按键时间可直接比较
+                    TRACER.record('player.startup', self._trace_id, self._play_ns, event[4])
+                    TRACER.finish(self._trace_id, end_ns=event[4])
+                    self._trace_id = 0
+                if self._on_progress:
+                    self._on_progress(event[1], event[2])
+            elif kind == EVT_COMPLETE:
+                self._set_idle()
+            elif kind == EVT_ERROR:
+                _log.error("播放进程异常: %s", event[1])
+                if self._on_error:
+                    self._on_error(event[1])
+                break
+
+        # 播放进程退出: 先回收进程，下次 play 时重新启动，再通知调用方
+        self._release_process(conn)
+        if self._is_playing:
+            self._set_idle()
+
+    def _set_idle(self):
+        """标记播放结束并触发完成回调"""
+        TRACER.discard(self._trace_id)
+        self._trace_id = 0
+        self._is_playing = False
+        self._is_paused = False
+        self._current_idx = 0
+        self._idle_event.set()
+        if self._on_complete:
+            self._on_complete()
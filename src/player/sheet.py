@@ -4,10 +4,18 @@
 """
 
 import json
+import re
+from collections import defaultdict
 from pathlib import Path
 from dataclasses import dataclass
 from typing import Optional
 
+# 光遇钢琴键数
+KEY_COUNT = 15
+
+# 按键标识格式，如 "1Key0"、"2Key14"
+_KEY_PATTERN = re.compile(r'^\d*Key(\d+)$')
+
 
 @dataclass
 class Note:
@@ -33,6 +41,31 @@ class Sheet:
             self.duration = max(n.time for n in self.notes)
 
 
+def key_index(key: str) -> int:
+    """按键标识转换为键位序号 (0-14)，无法识别时返回 -1"""
+    if not isinstance(key, str):
+        return -1
+    match = _KEY_PATTERN.match(key)
+    if not match:
+        return -1
+    idx = int(match.group(1))
+    return idx if idx < KEY_COUNT else -1
+
+
+def compile_timeline(sheet: Sheet) -> list[tuple[int, list[str]]]:
+    """将乐谱编译为按时间排序的时间轴
+
+    同一时间点的音符合并为一组 (和弦)
+
+    Returns:
+        [(时间点毫秒, [按键标识, ...]), ...]
+    """
+    notes_by_time = defaultdict(list)
+    for note in sheet.notes or []:
+        notes_by_time[note.time].append(note.key)
+    return sorted(notes_by_time.items())
+
+
 def parse_sheet(data: dict) -> Sheet:
     """解析乐谱数据"""
     # 兼容多种 JSON 结构
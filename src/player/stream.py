@@ -0,0 +1,300 @@
+"""
+流式乐谱加载
+逐块解码 JSON，从 songNotes 数组中边解析边产出音符，
+后台线程将音符按时间点分组后放入有界播放缓冲，内存只占用预读窗口
+"""
+
+import codecs
+import heapq
+import json
+import queue
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+from src.player.sheet import Note, Sheet, parse_sheet
+
+# 每次读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+# 预读窗口: 排序窗口内的音符数，同时也是缓冲队列中的时间点数
+LOOKAHEAD = 256
+
+_WHITESPACE = ' \t\r\n'
+_JSON = json.JSONDecoder()
+
+
+class SheetOrderError(ValueError):
+    """音符时间乱序超出预读窗口，流式播放无法保证演奏顺序"""
+
+    def __init__(self, note_time: int, emitted_time: int):
+        super().__init__(f"音符时间 {note_time}ms 早于已输出的时间点 {emitted_time}ms，乱序超出预读窗口")
+        self.note_time = note_time
+        self.emitted_time = emitted_time
+
+
+class SheetReader:
+    """增量乐谱解析器
+
+    打开时只解析到 songNotes 数组开头，songNotes 之前的字段作为乐谱信息，
+    之后通过 notes() 逐个产出音符
+    """
+
+    def __init__(self, file_path: str | Path, chunk_size: int = CHUNK_SIZE):
+        """打开乐谱文件并解析头部
+
+        Args:
+            file_path: 乐谱文件路径
+            chunk_size: 每次读取的字节数
+
+        Raises:
+            ValueError: 文件不是可识别的乐谱格式
+        """
+        self.path = Path(file_path)
+        self.chunk_size = chunk_size
+        self._file = open(self.path, 'rb')
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+        self._in_notes = False
+        try:
+            self._decoder = self._detect_encoding()
+            self.sheet = self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def notes(self) -> Iterator[Note]:
+        """按文件中的顺序逐个产出音符"""
+        while self._in_notes:
+            c = self._skip_whitespace()
+            if c == ']':
+                self._pos += 1
+                self._in_notes = False
+            elif c == ',':
+                self._pos += 1
+            elif not c:
+                raise ValueError(f"乐谱文件不完整: {self.path}")
+            else:
+                item = self._read_value()
+                if not isinstance(item, dict):
+                    raise ValueError(f"音符格式错误: {item!r}")
+                note_time, key = item.get('time'), item.get('key')
+                if not isinstance(note_time, (int, float)) or isinstance(note_time, bool):
+                    raise ValueError(f"音符时间不是数字: {note_time!r}")
+                if not isinstance(key, str):
+                    raise ValueError(f"按键标识不是字符串: {key!r}")
+                yield Note(time=round(note_time), key=key)
+
+    def _detect_encoding(self):
+        """按 BOM 和首块内容选择解码器 (与 load_sheet 支持的编码一致)"""
+        head = self._file.read(self.chunk_size)
+        self._file.seek(0)
+        if head.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        elif head[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+            encoding = 'utf-16'
+        else:
+            try:
+                codecs.getincrementaldecoder('utf-8')().decode(head)
+                encoding = 'utf-8'
+            except UnicodeDecodeError:
+                encoding = 'gbk'
+        return codecs.getincrementaldecoder(encoding)()
+
+    def _fill(self) -> bool:
+        """读取下一块，返回是否读到了新内容"""
+        if self._eof:
+            return False
+        data = self._file.read(self.chunk_size)
+        try:
+            text = self._decoder.decode(data, final=not data)
+        except UnicodeDecodeError as e:
+            raise ValueError(f"无法解析乐谱文件: {self.path} ({e})") from e
+        if not data:
+            self._eof = True
+        # 丢弃已解析的部分，缓冲区只保留一块加上当前未完成的值
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return bool(data or text)
+
+    def _skip_whitespace(self) -> str:
+        """跳过空白，返回下一个字符 (文件结束时返回空串)"""
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self._fill():
+                return ''
+
+    def _read_value(self):
+        """解析当前位置的一个完整 JSON 值，数据不足时继续读取"""
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _JSON.raw_decode(self._buf, self._pos)
+                # 数字位于缓冲区末尾时可能被截断，读到后续字符再确认
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise ValueError(f"无法解析乐谱文件: {self.path}")
+            self._fill()
+
+    def _expect(self, char: str):
+        if self._skip_whitespace() != char:
+            raise ValueError(f"无法解析乐谱文件: {self.path}")
+        self._pos += 1
+
+    def _read_header(self) -> Sheet:
+        """解析 songNotes 之前的字段"""
+        # 兼容外层包一层数组的结构
+        if self._skip_whitespace() == '[':
+            self._pos += 1
+        self._expect('{')
+
+        header = {}
+        while True:
+            c = self._skip_whitespace()
+            if c == '}' or not c:
+                break
+            if c == ',':
+                self._pos += 1
+                continue
+            key = self._read_value()
+            self._expect(':')
+            if key == 'songNotes':
+                self._expect('[')
+                self._in_notes = True
+                break
+            header[key] = self._read_value()
+
+        # songNotes 之后的字段此时还读不到，缺少曲名时用文件名
+        if not (header.get('songName') or header.get('name')):
+            header['name'] = self.path.stem
+        header['songNotes'] = []
+        return parse_sheet(header)
+
+
+class TimelineBuffer:
+    """播放缓冲 - 后台线程增量解析乐谱，按时间点分组后放入有界队列
+
+    乐谱中的音符在预读窗口内按时间重新排序；读到早于已输出时间点的音符时
+    以 SheetOrderError 结束，并丢弃尚未取出的时间点，由调用方改为完整加载
+    """
+
+    def __init__(self, file_path: str | Path, lookahead: int = LOOKAHEAD):
+        """打开乐谱 (只解析头部，不读取音符)
+
+        Args:
+            file_path: 乐谱文件路径
+            lookahead: 预读窗口大小
+
+        Raises:
+            ValueError: 文件不是可识别的乐谱格式
+        """
+        self.reader = SheetReader(file_path)
+        self.sheet = self.reader.sheet
+        self.lookahead = lookahead
+        self.produced = 0  # 已解析出的时间点数
+        self._emitted_time = -1  # 最近输出的时间点
+        self.error: Optional[Exception] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=lookahead)
+        self._stop_event = threading.Event()
+        self._done = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台解析线程"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._produce, name='sky-forge-sheet-reader', daemon=True)
+        self._thread.start()
+
+    def get(self) -> Optional[tuple[int, list[str]]]:
+        """取出下一个时间点，乐谱结束时返回 None
+
+        Raises:
+            SheetOrderError: 音符乱序超出预读窗口
+            ValueError: 乐谱在解析过程中出错
+        """
+        if self._done:
+            return None
+        entry = self._queue.get()
+        if entry is None:
+            self._done = True
+            if isinstance(self.error, SheetOrderError):
+                raise self.error
+            if self.error:
+                raise ValueError(f"解析乐谱失败: {self.error}") from self.error
+        return entry
+
+    def close(self):
+        """停止后台解析并关闭文件"""
+        self._stop_event.set()
+        if self._thread is None:
+            self.reader.close()
+
+    def _produce(self):
+        """解析线程 - 小顶堆在预读窗口内按时间排序后分组输出"""
+        heap: list[tuple[int, int, str]] = []
+        try:
+            for seq, note in enumerate(self.reader.notes()):
+                if note.time < self._emitted_time:
+                    raise SheetOrderError(note.time, self._emitted_time)
+                heapq.heappush(heap, (note.time, seq, note.key))
+                if len(heap) > self.lookahead and not self._emit(heap):
+                    return
+            while heap:
+                if not self._emit(heap):
+                    return
+        except SheetOrderError as e:
+            self.error = e
+            # 已输出的时间点中有晚于该音符的，不再演奏，尽快通知调用方
+            self._drain()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.reader.close()
+            self._put(None)
+
+    def _emit(self, heap: list) -> bool:
+        """输出最早的时间点 (同一时间的音符合并为和弦)"""
+        note_time = heap[0][0]
+        keys = []
+        while heap and heap[0][0] == note_time:
+            keys.append(heapq.heappop(heap)[2])
+        self.produced += 1
+        self._emitted_time = note_time
+        return self._put((note_time, keys))
+
+    def _drain(self):
+        """丢弃缓冲队列中尚未取出的时间点"""
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def _put(self, entry) -> bool:
+        """放入缓冲队列，队列满时等待消费，已关闭时返回 False"""
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
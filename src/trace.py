@@ -0,0 +1,131 @@
+"""
+请求追踪
+从收到弹幕到第一个音符按下，按请求 ID 记录各阶段耗时，
+保存在内存环形缓冲区中，可随时导出为 Chrome/Perfetto trace JSON
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+
+@dataclass
+class Span:
+    """一段耗时记录"""
+    name: str                           # 阶段名称
+    request_id: int                     # 请求 ID
+    start_ns: int                       # 开始时间 (time.perf_counter_ns)
+    end_ns: int                         # 结束时间 (time.perf_counter_ns)
+    args: Optional[dict[str, Any]] = None  # 附加信息
+
+
+class Tracer:
+    """请求追踪器 - 请求 ID 为 0 表示不追踪"""
+
+    def __init__(self, capacity: int = 10000, max_pending: int = 1024):
+        """初始化追踪器
+
+        Args:
+            capacity: 环形缓冲区保留的 span 数量
+            max_pending: 最多同时跟踪的未完成请求数，超出时丢弃最早的
+        """
+        self._spans: deque[Span] = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._pending: OrderedDict[int, int] = OrderedDict()  # 请求 ID -> 起点
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+
+    def new_request(self, start_ns: Optional[int] = None) -> int:
+        """创建请求 ID，并记下请求起点
+
+        Args:
+            start_ns: 起点 (time.perf_counter_ns)，默认为当前时间
+        """
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = start_ns or time.perf_counter_ns()
+            if len(self._pending) > self._max_pending:
+                self._pending.popitem(last=False)
+        return request_id
+
+    def discard(self, request_id: int):
+        """放弃跟踪请求 (如普通聊天、未找到曲目)"""
+        if request_id:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def finish(self, request_id: int, name: str = 'request', end_ns: Optional[int] = None):
+        """请求结束，记录从起点到结束 (默认为现在) 的总耗时"""
+        if not request_id:
+            return
+        with self._lock:
+            start_ns = self._pending.pop(request_id, None)
+        if start_ns is not None:
+            self.record(name, request_id, start_ns, end_ns)
+
+    def record(self, name: str, request_id: int, start_ns: int,
+               end_ns: Optional[int] = None, **args):
+        """记录一段耗时"""
+        if not request_id:
+            return
+        self._spans.append(Span(
+            name=name,
+            request_id=request_id,
+            start_ns=start_ns,
+            end_ns=end_ns if end_ns is not None else time.perf_counter_ns(),
+            args=args or None,
+        ))
+
+    @contextmanager
+    def span(self, name: str, request_id: int, **args) -> Iterator[None]:
+        """记录代码块耗时"""
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, request_id, start_ns, **args)
+
+    def spans(self) -> list[Span]:
+        """当前缓冲区中的 span"""
+        return list(self._spans)
+
+    def to_chrome_trace(self) -> dict:
+        """导出为 Chrome/Perfetto trace 格式，每个请求一条轨道"""
+        pid = os.getpid()
+        events = []
+        seen = set()
+        for span in self.spans():
+            if span.request_id not in seen:
+                seen.add(span.request_id)
+                events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': span.request_id,
+                    'args': {'name': f'request {span.request_id}'},
+                })
+            event = {
+                'name': span.name,
+                'cat': 'request',
+                'ph': 'X',
+                'pid': pid,
+                'tid': span.request_id,
+                'ts': span.start_ns / 1000,
+                'dur': (span.end_ns - span.start_ns) / 1000,
+                'args': {'request_id': span.request_id, **(span.args or {})},
+            }
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, path: str | Path):
+        """写出 trace JSON 文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f, ensure_ascii=False)
+
+
+# 全局追踪器
+TRACER = Tracer()